@@ -0,0 +1,167 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import authentication, exceptions
+
+from utils.cache import TwoTierCache
+from utils.db.routers import use_primary
+from . import tokens
+
+token_cache = TwoTierCache(
+    'auth:token',
+    timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT,
+    local_maxsize=settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+user_cache = TwoTierCache(
+    'auth:user',
+    timeout=settings.AUTH_USER_CACHE_TIMEOUT,
+    local_maxsize=settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+
+
+def _token_cache_key(key):
+    # Raw token keys never leave the process; the shared cache only sees
+    # their digest.
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    token_cache.delete(_token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+
+def invalidate_user_tokens(user):
+    from rest_framework.authtoken.models import Token
+
+    keys = Token.objects.filter(user=user).values_list('key', flat=True)
+    token_cache.delete_many([_token_cache_key(key) for key in keys])
+    invalidate_user(user.pk)
+
+
+def get_users_many(user_ids):
+    """
+    Returns `{str(user_id): user}` for the active users among `user_ids`,
+    through the cache. The instances may be shared with other threads;
+    copy them before making changes.
+    """
+    user_ids = {str(user_id) for user_id in user_ids}
+    found = user_cache.get_many(user_ids)
+    missing = user_ids.difference(found)
+    if missing:
+        with use_primary():
+            loaded = {str(user.pk): user for user in get_user_model()
+                      .objects.filter(pk__in=missing, is_active=True)}
+        user_cache.set_many(loaded)
+        found.update(loaded)
+
+    return found
+
+
+def get_user(user_id):
+    """
+    Returns the active user `user_id` through the cache, or None.
+    """
+    user = get_users_many([user_id]).get(str(user_id))
+    return copy.deepcopy(user) if user is not None else None
+
+
+def get_token_users_many(keys):
+    """
+    Returns `{key: user}` for the tokens among `keys` that belong to active
+    users, through the token cache. The instances may be shared like those
+    of `get_users_many`.
+    """
+    from rest_framework.authtoken.models import Token
+
+    keys = {_token_cache_key(key): key for key in keys}
+    found = token_cache.get_many(keys)
+    missing = [keys[cache_key] for cache_key in keys if cache_key not in found]
+    if missing:
+        with use_primary():
+            loaded = {_token_cache_key(token.key): token for token in
+                      Token.objects.select_related('user')
+                      .filter(key__in=missing, user__is_active=True)}
+        token_cache.set_many(loaded)
+        found.update(loaded)
+
+    return {keys[cache_key]: token.user
+            for cache_key, token in found.items()}
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    Token authentication resolving `key -> (user, token)` through the
+    process LRU and the shared cache before falling back to the database.
+    Entries are dropped on logout, on token deletion and whenever the
+    owning user is saved (e.g. deactivated).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_cache_key(key)
+        token = token_cache.get(cache_key)
+
+        if token is None:
+            model = self.get_model()
+            try:
+                # Read the primary: a replica may not have the token of a
+                # fresh login yet, or still have one that was deleted.
+                with use_primary():
+                    token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            if token.user.is_active:
+                token_cache.set(cache_key, token)
+        else:
+            # Cached instances are shared between the threads of this
+            # process; hand every request its own copy.
+            token = copy.deepcopy(token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Bearer authentication with the signed access tokens of auth.tokens.
+    The signature and expiry are checked locally; only the denylist and
+    the (cached) user are looked up. `request.auth` is the token claims.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header.'))
+
+        try:
+            claims = tokens.decode(auth[1].decode())
+        except (tokens.InvalidToken, UnicodeError):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if tokens.is_revoked(claims):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user = get_user(claims['sub'])
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        return (user, claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -2,30 +2,75 @@ import re
 
 from django.contrib.auth.backends import ModelBackend
 
+from users import rbac
 from users.models import User
+from . import hashing
 
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
 
-class EmailOrUsernameModelBackend(ModelBackend):
 
-    def authenticate(self, request, **kwargs):
-        username = kwargs['username']
-        password = kwargs['password']
+def get_user_by_username(username):
+    """
+    Returns the account matching `username` case-insensitively, looking
+    it up by email when it looks like one and by username otherwise.
+    """
+    if not username:
+        return None
 
-        if username and re.search(r'[^@\s]+@[^@\s]+\.[^@\s]+', username):
-            kwargs = {'email': username}
-        else:
-            kwargs = {'username': username}
+    if EMAIL_PATTERN.search(username):
+        username_field = 'email'
+    else:
+        username_field = 'username'
 
-        try:
-            user = User.objects.get(**kwargs)
-        except User.DoesNotExist:
+    return User.objects.get_case_insensitive(username_field, username)
+
+
+class EmailOrUsernameModelBackend(ModelBackend):
+    """
+    Login engine for both the API and the admin: one indexed lookup and
+    at most one password hash per attempt, whatever the outcome.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = get_user_by_username(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            hashing.make_password(password)
             return None
-        else:
-            if user.is_active and user.check_password(password):
-                return user
+
+        # Outdated hashes are upgraded here, on a successful check.
+        if (hashing.check_password(user, password)
+                and self.user_can_authenticate(user)):
+            return user
 
         return None
 
+    def get_all_permissions(self, user_obj, obj=None):
+        """
+        Serves permission checks (e.g. DjangoModelPermissions) from the
+        cached effective permission set instead of two joins per request.
+        """
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if not hasattr(user_obj, '_perm_cache'):
+            names = rbac.get_permission_names()
+            if user_obj.is_superuser:
+                perms = set(names.values())
+            else:
+                permission_ids = rbac.get_effective_permission_ids(
+                    user_obj.pk) or ()
+                perms = {names[pk] for pk in permission_ids if pk in names}
+            user_obj._perm_cache = perms
+
+        return user_obj._perm_cache
+
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
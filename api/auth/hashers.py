@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class Argon2idPasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with the cost parameters from the PASSWORD_ARGON2_* settings.
+
+    It keeps Django's 'argon2' algorithm name so it also verifies the
+    argon2i hashes of Django's hasher; those, and hashes made with other
+    parameters, are upgraded on the next successful login.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+    @staticmethod
+    def _type(argon2, variety):
+        if variety == 'argon2id':
+            return argon2.low_level.Type.ID
+        return argon2.low_level.Type.I
+
+    def encode(self, password, salt):
+        argon2 = self._load_library()
+        data = argon2.low_level.hash_secret(
+            password.encode(),
+            salt.encode(),
+            time_cost=self.time_cost,
+            memory_cost=self.memory_cost,
+            parallelism=self.parallelism,
+            hash_len=argon2.DEFAULT_HASH_LENGTH,
+            type=argon2.low_level.Type.ID,
+        )
+        return self.algorithm + data.decode('ascii')
+
+    def verify(self, password, encoded):
+        argon2 = self._load_library()
+        algorithm, rest = encoded.split('$', 1)
+        assert algorithm == self.algorithm
+        variety = rest.split('$', 1)[0]
+        try:
+            return argon2.low_level.verify_secret(
+                ('$' + rest).encode('ascii'),
+                password.encode(),
+                type=self._type(argon2, variety),
+            )
+        except argon2.exceptions.VerificationError:
+            return False
+
+    def must_update(self, encoded):
+        variety = self._decode(encoded)[1]
+        return variety != 'argon2id' or super().must_update(encoded)
@@ -0,0 +1,164 @@
+"""
+Password hashing for the login and signup paths.
+
+Hashes are computed by a dedicated executor of PASSWORD_HASHING_POOL_SIZE
+workers per process ('thread', the default, as argon2 releases the GIL,
+or 'process'; 'none' hashes on the request thread). At most
+PASSWORD_HASHING_MAX_PENDING hashes may be running or queued per process;
+beyond that, requests fail fast with a 503 and a Retry-After header
+instead of piling up behind a login spike, which keeps the other
+endpoints responsive.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import ugettext_lazy as _
+
+from config import exceptions
+from utils import metrics, processes
+
+_lock = threading.Lock()
+_executor = None
+_pending = None
+# What the executor was created for, see `_get_executor_key`
+_executor_key = None
+HASHER_SETTINGS = ('PASSWORD_HASHERS', 'PASSWORD_ARGON2_TIME_COST',
+                   'PASSWORD_ARGON2_MEMORY_COST', 'PASSWORD_ARGON2_PARALLELISM')
+
+
+def _get_executor_key():
+    kind = settings.PASSWORD_HASHING_POOL
+    size = settings.PASSWORD_HASHING_POOL_SIZE or os.cpu_count() or 1
+    # Worker processes keep the settings they were started with, so a
+    # change of hasher settings (e.g. override_settings) needs new ones.
+    hasher_settings = tuple((name, getattr(settings, name))
+                            for name in HASHER_SETTINGS)
+    return (os.getpid(), kind, size, settings.PASSWORD_HASHING_MAX_PENDING,
+            hasher_settings)
+
+
+def _get_executor():
+    global _executor, _executor_key, _pending
+
+    if settings.PASSWORD_HASHING_POOL not in ('thread', 'process'):
+        return None, None
+
+    key = _get_executor_key()
+    if _executor_key == key:
+        return _executor, _pending
+
+    with _lock:
+        if _executor_key != key:
+            previous, previous_key = _executor, _executor_key
+            pid, kind, size, max_pending, hasher_settings = key
+            if kind == 'process':
+                # Not forked from here: the pool starts from a request
+                # thread, and a child forked from a threaded worker can
+                # deadlock on locks other threads held (logging, clients).
+                _executor = ProcessPoolExecutor(
+                    size, mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=processes.setup_django,
+                    initargs=(hasher_settings,))
+            else:
+                _executor = ThreadPoolExecutor(
+                    size, thread_name_prefix='password-hashing')
+            _pending = threading.BoundedSemaphore(max(max_pending, 1))
+            _executor_key = key
+            # An executor inherited through fork() (gunicorn's) has no
+            # workers here.
+            if previous is not None and previous_key[0] == pid:
+                previous.shutdown()
+
+    return _executor, _pending
+
+
+def _run(func, *args):
+    executor, pending = _get_executor()
+    if executor is None:
+        return func(*args)
+
+    if (settings.PASSWORD_HASHING_MAX_PENDING <= 0
+            or not pending.acquire(blocking=False)):
+        metrics.incr('auth.hashing.rejected')
+        raise exceptions.ServiceUnavailable(
+            _('Too many logins in progress, please try again shortly.'),
+            wait=settings.PASSWORD_HASHING_RETRY_AFTER)
+
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        pending.release()
+
+
+def _hash(func, *args):
+    metrics.incr('auth.hashing.hashes')
+    started = time.perf_counter()
+    result = _run(func, *args)
+    # Wall time including the pool round-trip; with the number of hashes
+    # it gives the average cost of a hash.
+    metrics.incr('auth.hashing.ms', (time.perf_counter() - started) * 1000)
+    return result
+
+
+def _verify(password, encoded):
+    return hashers.check_password(password, encoded)
+
+
+def get_average_hash_ms():
+    """
+    The average duration of the hashes computed by this process so far.
+    """
+    hashes = metrics.get('auth.hashing.hashes')
+    return metrics.get('auth.hashing.ms') / hashes if hashes else 0
+
+
+def make_password(password):
+    """
+    Hashes `password` with the preferred hasher. Raises ServiceUnavailable
+    when the hashing queue of this process is full.
+    """
+    return _hash(hashers.make_password, password)
+
+
+def must_update(encoded):
+    """
+    Whether a stored hash was made with another hasher or with other
+    parameters than the preferred hasher's current ones.
+    """
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    preferred = hashers.get_hasher('default')
+    return (hasher.algorithm != preferred.algorithm
+            or preferred.must_update(encoded))
+
+
+def check_password(user, password):
+    """
+    Checks `password` against the user's stored hash and, when it matches
+    and the hash is outdated, stores a hash made with the current hasher
+    and parameters. Raises ServiceUnavailable when the hashing queue of
+    this process is full.
+    """
+    if password is None or not hashers.is_password_usable(user.password):
+        return False
+
+    is_correct = _hash(_verify, password, user.password)
+    if is_correct and must_update(user.password):
+        try:
+            encoded = make_password(password)
+        except exceptions.ServiceUnavailable:
+            # The upgrade can wait for the next login.
+            return is_correct
+        user.password = encoded
+        user.save(update_fields=['password'])
+        metrics.incr('auth.hashing.upgrades')
+
+    return is_correct
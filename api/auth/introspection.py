@@ -0,0 +1,90 @@
+"""
+Token introspection for gateways: resolves opaque and signed access
+tokens to their user, roles and effective permissions in one call.
+
+Every lookup goes through the token, user and RBAC caches in batches, so
+a warm introspection of any number of tokens does not touch the
+database. Results may be reused by the caller for AUTH_INTROSPECTION_MAX_AGE
+seconds (never past a signed token's expiry); revocations and role
+changes take up to that long to reach a caching gateway.
+"""
+import time
+
+from django.conf import settings
+
+from users import rbac
+from utils import metrics
+from . import authentication, tokens
+
+
+def _is_signed(token):
+    return token.count('.') == 2
+
+
+def _decode_signed(signed_tokens):
+    claims = {}
+    for token in signed_tokens:
+        try:
+            claims[token] = tokens.decode(token)
+        except tokens.InvalidToken:
+            pass
+
+    revoked = tokens.get_revoked(
+        [token_claims['jti'] for token_claims in claims.values()])
+    return {token: token_claims for token, token_claims in claims.items()
+            if token_claims['jti'] not in revoked}
+
+
+def introspect(token_list):
+    """
+    Returns `(results, max_age)`: one result per token of `token_list`, in
+    order, and for how many seconds all of them may be reused. Tokens that
+    are unknown, expired, revoked or whose user is inactive come back as
+    `{'active': False}`.
+    """
+    metrics.incr('auth.introspection.tokens', len(token_list))
+    claims = _decode_signed({token for token in token_list
+                             if _is_signed(token)})
+    owners = authentication.get_token_users_many(
+        {token for token in token_list if not _is_signed(token)})
+    users = authentication.get_users_many(
+        token_claims['sub'] for token_claims in claims.values())
+    owners.update((token, users[token_claims['sub']])
+                  for token, token_claims in claims.items()
+                  if token_claims['sub'] in users)
+
+    max_age = settings.AUTH_INTROSPECTION_MAX_AGE
+    if claims:
+        expires_at = min(token_claims['exp']
+                         for token_claims in claims.values())
+        max_age = max(0, min(max_age, expires_at - int(time.time())))
+    if not owners:
+        return [{'active': False} for token in token_list], max_age
+
+    user_ids = {str(user.pk) for user in owners.values()}
+    grants = rbac.get_user_grants_many(user_ids)
+    effective = rbac.get_effective_permission_ids_many(user_ids)
+    role_names = {pk: name for name, pk in rbac.get_catalog().roles}
+    permission_names = rbac.get_permission_names()
+
+    results = []
+    for token in token_list:
+        user = owners.get(token)
+        user_id = str(user.pk) if user is not None else None
+        if user_id not in grants:
+            results.append({'active': False})
+            continue
+
+        results.append({
+            'active': True,
+            'user_id': user_id,
+            'username': user.username,
+            'roles': sorted(role_names[pk] for pk in grants[user_id].group_ids
+                            if pk in role_names),
+            'permissions': sorted(permission_names[pk]
+                                  for pk in effective[user_id]
+                                  if pk in permission_names),
+            'exp': claims[token]['exp'] if token in claims else None,
+        })
+
+    return results, max_age
@@ -1,5 +1,6 @@
-import re
+from types import SimpleNamespace
 
+from django.conf import settings as django_settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.models import Permission, Group
 from django.contrib.auth.password_validation import validate_password
@@ -14,6 +15,7 @@ from rest_framework import exceptions as drf_exceptions
 from djoser import utils
 from djoser.conf import settings
 from config import exceptions
+from . import gate, hashing
 
 User = get_user_model()
 
@@ -28,10 +30,21 @@ class SignUpSerializer(serializers.ModelSerializer):
             'email',
             'password',
         )
+        # Replaced by the case-insensitive probe in validate_email.
+        extra_kwargs = {'email': {'validators': []}}
+
+    def validate_email(self, value):
+        if User.objects.email_exists(value):
+            raise exceptions.AlreadyExists(
+                _('The provided email address already has an account.'))
+
+        return value
 
     def validate(self, attrs):
-        user = User(**attrs)
         password = attrs.get('password')
+        # The similarity validator only reads the attributes and field
+        # names of the user, no need for a model instance.
+        user = SimpleNamespace(_meta=User._meta, **attrs)
 
         try:
             validate_password(password, user)
@@ -46,6 +59,10 @@ class SignUpSerializer(serializers.ModelSerializer):
         try:
             user = self.perform_create(validated_data)
         except IntegrityError:
+            # Lost a race with a concurrent signup after validate_email; the
+            # failed INSERT has aborted the enclosing transaction.
+            if transaction.get_connection().in_atomic_block:
+                transaction.set_rollback(True)
             raise exceptions.AlreadyExists(
                 _('The provided email address already has an account.'))
 
@@ -53,11 +70,12 @@ class SignUpSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def perform_create(validated_data):
-        with transaction.atomic():
-            user = User.objects.create_user(**validated_data)
-            user.is_active = True
-            user.save(update_fields=['is_active'])
-        return user
+        # Hashed on the bounded hashing pool; fails with 503 when it is full.
+        validated_data = dict(validated_data)
+        encoded_password = hashing.make_password(
+            validated_data.pop('password'))
+        return User.objects.create_active_user(
+            encoded_password=encoded_password, **validated_data)
 
 
 class TokenSerializer(serializers.ModelSerializer):
@@ -68,6 +86,27 @@ class TokenSerializer(serializers.ModelSerializer):
         fields = ('auth_token', )
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
+class IntrospectionSerializer(serializers.Serializer):
+    token = serializers.CharField(required=False)
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        max_length=django_settings.AUTH_INTROSPECTION_MAX_TOKENS
+    )
+
+    def validate(self, attrs):
+        if ('token' in attrs) == ('tokens' in attrs):
+            raise serializers.ValidationError(
+                "Either 'token' or 'tokens' is required.")
+
+        return attrs
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(style={'input_type': 'password'})
@@ -79,33 +118,20 @@ class LoginSerializer(serializers.Serializer):
     def validate(self, attrs):
         username = attrs.get('username')
         password = attrs.get('password')
+        request = self.context.get('request')
 
-        user_account = self._get_user_by_username(username)
-        if not user_account:
+        # Rejects repeated failures before any password is hashed.
+        gate.check(request, username)
+        self.user = authenticate(request=request,
+                                 username=username, password=password)
+        if not self.user:
+            gate.record_failure(request, username)
             raise drf_exceptions.AuthenticationFailed(
                 _('Unable to login with the provided credentials.'))
 
-        self.user = authenticate(username=username, password=password)
-        if not self.user:
-            if user_account.is_active:
-                raise drf_exceptions.AuthenticationFailed(
-                    _('Unable to login with the provided credentials.'))
-
+        gate.record_success(request, username)
         return attrs
 
-    @staticmethod
-    def _get_user_by_username(username):
-        if username and re.search(r'[^@\s]+@[^@\s]+\.[^@\s]+', username):
-            username_field = 'email'
-        else:
-            username_field = 'username'
-
-        user = User.objects.filter(**{
-            username_field + '__iexact': username
-        }).first()
-
-        return user
-
 
 class CreatePermissionsSerializer(serializers.Serializer):
     codename = serializers.CharField()
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import user_logged_in
+
+from djoser import utils
+
+from users import tasks
+from users.models import AuditEvent
+from utils.tasks import dispatch
+from . import serializers, tokens
+
+
+def login_user(request, user):
+    """
+    Issues (or reuses) the user's token, or signed tokens when
+    AUTH_TOKEN_MODE is 'signed', and returns the payload of
+    `POST /api/login`.
+    """
+    if settings.AUTH_TOKEN_MODE == 'signed':
+        data = tokens.issue_tokens(user)
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
+        data.update(userid=user.id, username=user.username)
+        return data
+
+    token = utils.login_user(request, user)
+    token_serializer_class = serializers.TokenSerializer
+    return {
+        "token": token_serializer_class(token).data,
+        "userid": user.id,
+        "username": user.username,
+    }
+
+
+def login(request, username, password):
+    """
+    Validates the credentials and logs the user in. Raises the same DRF
+    exceptions as `POST /api/login` on failure.
+    """
+    serializer = serializers.LoginSerializer(
+        data={'username': username, 'password': password},
+        context={'request': request})
+    serializer.is_valid(raise_exception=True)
+
+    return login_user(request, serializer.user)
+
+
+def register_user(request, serializer):
+    """
+    Saves the new account. djoser's `user_registered` receivers and the
+    audit write run asynchronously, see users.tasks.
+    """
+    user = serializer.save()
+    dispatch(tasks.send_user_registered, str(user.pk))
+    tasks.audit(AuditEvent.SIGNUP, request, user=user)
+    return user
+
+
+def signup(request, data):
+    """
+    Creates an account from `data` like `POST /api/signup` does and
+    returns the new user. Raises the same DRF exceptions on failure.
+    """
+    serializer = serializers.SignUpSerializer(
+        data=data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+
+    return register_user(request, serializer)
@@ -1,7 +1,28 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
 from rest_framework.authtoken.models import Token
+from unittest import mock
+import base64
+import json
+
 from rest_framework.test import APITestCase, APIClient, APIRequestFactory, force_authenticate
-from users.models import User
+from auth import gate, hashing, tokens
+from auth.serializers import LoginSerializer
+from users.models import AuditEvent, RefreshToken, User
+from utils import metrics
+from utils.cache import clear_local_caches
 
 
 class AuthTest(APITestCase):
@@ -11,6 +32,8 @@ class AuthTest(APITestCase):
         self.factory = APIRequestFactory()
         self.user = User.objects.create_superuser('admin@admin.com', 'admin1234')
         self.token = Token.objects.create(user=self.user)
+        cache.clear()
+        clear_local_caches()
 
         # Set Credentials
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
@@ -23,6 +46,28 @@ class AuthTest(APITestCase):
         self.assertEqual(User.objects.count(), 2)
         self.assertEqual(User.objects.get(email='test@gmail.com').email, 'test@gmail.com')
 
+    def test_create_user_single_insert(self):
+        url = f'{self.base_url}/signup'
+        data =  {'username': 'test', 'email': 'test@gmail.com', 'password': 'test1234test'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [q['sql'].split(' ', 1)[0] for q in queries
+                  if 'users_user"' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, ['INSERT'])
+        self.assertTrue(User.objects.get(email='test@gmail.com').is_active)
+
+
+    def test_create_user_existing_email(self):
+        url = f'{self.base_url}/signup'
+        data =  {'username': 'test', 'email': 'ADMIN@admin.com', 'password': 'test1234test'}
+        with mock.patch('auth.hashing.make_password') as make_password:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        make_password.assert_not_called()
+        self.assertEqual(User.objects.count(), 1)
+
+
     def test_create_user_invalid_password(self):
         url = f'{self.base_url}/signup'
         data =  {'username': 'test', 'email': 'test@gmail.com', 'password': 'test'}
@@ -44,6 +89,178 @@ class AuthTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+    def test_login_with_username(self):
+        User.objects.create_user('test@gmail.com', 'test1234test', username='Tester')
+        url = f'{self.base_url}/login'
+        data =  {'username': 'tester', 'password': 'test1234test'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+    def test_login_upgrades_password_hash(self):
+        user = User.objects.create_user('test@gmail.com', None, username='test')
+        user.password = make_password('test1234test', hasher='pbkdf2_sha256')
+        user.save()
+        url = f'{self.base_url}/login'
+        data =  {'username': 'test@gmail.com', 'password': 'test1234test'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$argon2id$'))
+
+        with override_settings(PASSWORD_ARGON2_TIME_COST=3):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            user.refresh_from_db()
+            self.assertIn('t=3', user.password)
+
+
+    @override_settings(PASSWORD_HASHING_POOL='thread', PASSWORD_HASHING_POOL_SIZE=2)
+    def test_login_with_hashing_pool(self):
+        User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+        url = f'{self.base_url}/login'
+        data =  {'username': 'test@gmail.com', 'password': 'test1234test'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data['password'] = 'wrong'
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    @override_settings(PASSWORD_HASHING_POOL='process', PASSWORD_ARGON2_TIME_COST=3)
+    def test_process_hashing_pool(self):
+        # Worker processes start afresh with the hasher settings in effect.
+        encoded = hashing.make_password('test1234test')
+        self.assertIn('t=3', encoded)
+        user = User(password=encoded)
+        self.assertTrue(hashing.check_password(user, 'test1234test'))
+
+
+    @override_settings(PASSWORD_HASHING_POOL='thread', PASSWORD_HASHING_MAX_PENDING=0,
+                       PASSWORD_HASHING_RETRY_AFTER=2)
+    def test_hashing_pool_full(self):
+        url = f'{self.base_url}/signup'
+        data =  {'username': 'test', 'email': 'test@gmail.com', 'password': 'test1234test'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(email='test@gmail.com').exists())
+
+        # Login runs in autocommit; its error response marks the test's
+        # transaction for rollback, so it goes last.
+        url = f'{self.base_url}/login'
+        data =  {'username': 'admin@admin.com', 'password': 'admin1234'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+    def test_login_side_effects(self):
+        url = f'{self.base_url}/login'
+        data =  {'username': 'admin@admin.com', 'password': 'admin1234'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        event = AuditEvent.objects.get(action=AuditEvent.LOGIN)
+        self.assertEqual(event.user_id, self.user.id)
+        self.assertEqual(event.ip_address, '127.0.0.1')
+
+        url = f'{self.base_url}/signup'
+        data =  {'username': 'test', 'email': 'test@gmail.com', 'password': 'test1234test'}
+        self.client.post(url, data, format='json')
+        self.assertTrue(AuditEvent.objects.filter(
+            action=AuditEvent.SIGNUP, username='test@gmail.com').exists())
+
+        # Login runs in autocommit, so the test's transaction would roll the
+        # event back with the error response; check what gets dispatched.
+        url = f'{self.base_url}/login'
+        data =  {'username': 'admin@admin.com', 'password': 'wrong'}
+        with mock.patch('users.tasks.dispatch') as dispatch:
+            self.client.post(url, data, format='json')
+        self.assertEqual(dispatch.call_args[0][1], AuditEvent.LOGIN_FAILED)
+        self.assertEqual(dispatch.call_args[1]['username'], 'admin@admin.com')
+
+
+    def test_last_login_updates_are_coalesced(self):
+        url = f'{self.base_url}/login'
+        data =  {'username': 'admin@admin.com', 'password': 'admin1234'}
+        with mock.patch('users.signals.cache.add', side_effect=[True, False]):
+            for expected_updates in (1, 0):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.post(url, data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                updates = [q for q in queries if q['sql'].startswith('UPDATE')
+                           and 'last_login' in q['sql']]
+                self.assertEqual(len(updates), expected_updates)
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        AUTH_GATE_ACCOUNT_DELAY_AFTER=2, AUTH_GATE_ACCOUNT_LOCKOUT_AFTER=4)
+    def test_login_gate(self):
+        request = self.factory.post(f'{self.base_url}/login')
+        data =  {'username': 'admin@admin.com', 'password': 'wrong'}
+        for _ in range(2):
+            serializer = LoginSerializer(data=data, context={'request': request})
+            with self.assertRaises(AuthenticationFailed):
+                serializer.is_valid()
+
+        # Progressively delayed, then locked out; the case of the email
+        # does not matter.
+        with self.assertRaises(Throttled) as raised:
+            gate.check(request, 'ADMIN@admin.com')
+        self.assertEqual(raised.exception.wait, 1)
+        for _ in range(2):
+            gate.record_failure(request, 'admin@admin.com')
+        with self.assertRaises(Throttled) as raised:
+            gate.check(request, 'admin@admin.com')
+        self.assertGreater(raised.exception.wait, 60)
+
+        # Locked out accounts are rejected before any hash, even with the
+        # right password.
+        hashes_saved = metrics.get('auth.gate.hashes_saved')
+        url = f'{self.base_url}/login'
+        data =  {'username': 'admin@admin.com', 'password': 'admin1234'}
+        with mock.patch('auth.hashing.check_password') as check_password:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        check_password.assert_not_called()
+        self.assertEqual(metrics.get('auth.gate.hashes_saved'), hashes_saved + 1)
+
+
+    def test_login_gate_client_address(self):
+        def get_address(**meta):
+            request = self.factory.post(f'{self.base_url}/login', REMOTE_ADDR='10.0.0.1', **meta)
+            return dict(gate._get_subjects(request, 'admin@admin.com'))
+
+        # X-Forwarded-For is client-controlled, ignored without proxies.
+        self.assertEqual(get_address(HTTP_X_FORWARDED_FOR='1.2.3.4'),
+                         get_address(HTTP_X_FORWARDED_FOR='5.6.7.8'))
+        self.assertEqual(get_address(HTTP_X_FORWARDED_FOR='1.2.3.4')['ip'], '10.0.0.1')
+
+        rest_framework = dict(settings.REST_FRAMEWORK, NUM_PROXIES=1)
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            subjects = get_address(HTTP_X_FORWARDED_FOR='1.2.3.4, 192.168.1.7')
+        self.assertEqual(subjects['ip'], '192.168.1.7')
+        self.assertEqual(subjects['prefix'], '192.168.1.0/24')
+
+        # Unparseable addresses fall back to the connection's.
+        rest_framework = dict(settings.REST_FRAMEWORK, NUM_PROXIES=None)
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            subjects = get_address(HTTP_X_FORWARDED_FOR='1.2.3.4,5.6.7.8')
+        self.assertEqual(subjects['ip'], '10.0.0.1')
+
+
+    def test_login_inactive_user(self):
+        User.objects.create_user('test@gmail.com', 'test1234test', username='test', is_active=False)
+        url = f'{self.base_url}/login'
+        data =  {'username': 'test@gmail.com', 'password': 'test1234test'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
     def test_login_invalid_credentials(self):
         url = f'{self.base_url}/login'
         data =  {'username': 'test1', 'password': 'test1234tesv'}
@@ -66,7 +283,7 @@ class AuthTest(APITestCase):
             'sessions.add_session', 'users.delete_user'}
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, expected_available_permissions)
+        self.assertEqual(response.data, sorted(expected_available_permissions))
 
 
     def test_create_permission(self):
@@ -147,6 +364,216 @@ class AuthTest(APITestCase):
         self.assertEqual(response_1.status_code, status.HTTP_409_CONFLICT)
 
 
+    def test_user_roles_bulk_assign_and_revoke(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        other = User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+        response = self.client.post(f'{self.base_url}/users/{other.id}/roles', {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f'{self.base_url}/users/roles'
+        missing_user = '00000000-0000-0000-0000-000000000000'
+        data = {'user_ids': [str(self.user.id), str(other.id), missing_user],
+                'roles': ['SysAdmin', 'NormalUser']}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'roles': {
+                'SysAdmin': {'status': 'assigned', 'changed': 1, 'unchanged': 1},
+                'NormalUser': {'status': 'not_found', 'changed': 0, 'unchanged': 0},
+            },
+            'unknown_user_ids': [missing_user],
+        })
+        self.assertEqual(set(self.user.groups.values_list('name', flat=True)), {'SysAdmin'})
+
+        data = {'user_ids': [str(self.user.id)], 'roles': ['SysAdmin'], 'action': 'revoke'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['roles'],
+                         {'SysAdmin': {'status': 'revoked', 'changed': 1, 'unchanged': 0}})
+        self.assertFalse(self.user.groups.exists())
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_user_roles_conditional_get(self):
+        url = f'{self.base_url}/roles'
+        for role_name in ('SysAdmin', 'NormalUser'):
+            data = {'permission_codename': 'add_user', 'role_name': role_name}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = f'{self.base_url}/users/{self.user.id}/roles'
+        response = self.client.post(url, {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.post(url, {'roles': 'NormalUser'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'SysAdmin', 'NormalUser'})
+        # Even within the second of the previous Last-Modified.
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+    def test_user_directory(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        users = [self.user] + [
+            User.objects.create_user(f'test{i}@gmail.com', 'test1234test', username=f'test{i}')
+            for i in range(4)]
+        for user in users[1:3]:
+            response = self.client.post(f'{self.base_url}/users/{user.id}/roles', {'roles': 'SysAdmin'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f'{self.base_url}/users/?limit=2'
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # One query for the page, one for the roles; none per user.
+            self.assertEqual(len(queries), 2)
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+            pages.append(response.data['results'])
+            url = response.data['next']
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        rows = [row for page in pages for row in page]
+        self.assertEqual([row['id'] for row in rows], [str(user.id) for user in users])
+        self.assertEqual([row['roles'] for row in rows], [[], ['SysAdmin'], ['SysAdmin'], [], []])
+
+        response = self.client.get(f'{self.base_url}/users/?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        cursor = base64.urlsafe_b64encode(b'[null, null]').decode()
+        response = self.client.get(f'{self.base_url}/users/', {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_user_export(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        other = User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+        response = self.client.post(f'{self.base_url}/users/{other.id}/roles', {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f'{self.base_url}/users/export'
+        with override_settings(USER_EXPORT_CHUNK_SIZE=1):
+            response = self.client.get(url)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([(row['email'], row['roles']) for row in rows], [
+            ('admin@admin.com', []), ('test@gmail.com', ['SysAdmin'])])
+
+        response = self.client.get(url, {'type': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,email,username,is_active,date_joined,roles')
+        self.assertTrue(lines[2].startswith(f'{other.id},test@gmail.com,test,True,'))
+        self.assertTrue(lines[2].endswith(',SysAdmin'))
+
+        response = self.client.get(url, {'type': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_user_import(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        upload = SimpleUploadedFile('users.csv', (
+            'email,username,password,password_hash,roles\n'
+            'one@gmail.com,one,test1234test,,SysAdmin\n'
+            f'two@gmail.com,two,,"{make_password("test1234test")}",\n'
+            'ADMIN@admin.com,admin,test1234test,,\n'
+            'three@gmail.com,three,test1234test,,NormalUser\n'
+            'four@gmail,four,test1234test,,\n'
+        ).encode())
+        url = f'{self.base_url}/users/import'
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = [json.loads(line) for line in
+                  b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(event['line'], event['email']) for event in events[:-2]], [
+            (4, 'ADMIN@admin.com'), (5, 'three@gmail.com'), (6, 'four@gmail')])
+        self.assertEqual(events[-1], {'result': {
+            'rows': 5, 'created': 2, 'memberships': 1, 'failed': 3}})
+
+        one = User.objects.get(email='one@gmail.com')
+        self.assertTrue(one.is_active)
+        self.assertEqual(list(one.groups.values_list('name', flat=True)), ['SysAdmin'])
+        response = self.client.post(f'{self.base_url}/login', {
+            'username': 'two@gmail.com', 'password': 'test1234test'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        upload = SimpleUploadedFile('users.jsonl', (
+            b'{"email": 5, "username": "five", "password": "test1234test"}\n'
+            b'{"email": "six@gmail.com", "username": "six", "password": 6}\n'
+            b'{"email": "seven@gmail.com", "username": "seven", "roles": 3}\n'
+            b'{"email": "eight@gmail.com", "username": "eight", '
+            b'"password": "test1234test", "roles": ["SysAdmin"]}\n'
+            b'{"email": "nine@gmail.com", "username": "\xff"}\n'
+        ))
+        url = f'{self.base_url}/users/import'
+        response = self.client.post(url, {'file': upload})
+        events = [json.loads(line) for line in
+                  b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(event['line'], event['email']) for event in events[:-2]], [
+            (1, ''), (2, 'six@gmail.com'), (3, 'seven@gmail.com'), (5, '')])
+        self.assertEqual(events[-1], {'result': {
+            'rows': 5, 'created': 1, 'memberships': 1, 'failed': 4}})
+        self.assertTrue(User.objects.filter(email='eight@gmail.com').exists())
+
+
+    def test_roles_catalog(self):
+        url = f'{self.base_url}/roles'
+        response = self.client.get(url)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        for role_name in ('SysAdmin', 'NormalUser', 'Auditor'):
+            data = {'permission_codename': 'add_user', 'role_name': role_name}
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data), ['Auditor', 'NormalUser', 'SysAdmin'])
+
+        response = self.client.get(url, {'search': 'USER', 'limit': 1})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(list(response.data['results']), ['NormalUser'])
+        response = self.client.get(url, {'limit': 2, 'offset': 2})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(list(response.data['results']), ['SysAdmin'])
+
+        url = f'{self.base_url}/permissions'
+        response = self.client.get(url, {'search': 'users.'})
+        self.assertEqual(response.data, ['users.add_user', 'users.change_user',
+                                         'users.delete_user', 'users.view_user'])
+        response = self.client.get(url, {'search': 'users.'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
     def test_retrieve_specific_user_roles(self):
         # Create roles
         url = f'{self.base_url}/roles'
@@ -196,6 +623,83 @@ class AuthTest(APITestCase):
         self.assertEqual(response.data, expected_user_permissions)
 
 
+    def test_user_permissions_served_from_cache(self):
+        url = f'{self.base_url}/users/{self.user.id}/permissions'
+        permission_id = str(Permission.objects.get(codename='add_user').id)
+        response = self.client.post(url, {'permission_ids': permission_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {permission_id: False})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'permission_ids': permission_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'auth_permission' in q['sql'] or 'users_user' in q['sql']])
+
+        # Assigning a role must invalidate the cached permission set
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(f'{self.base_url}/roles', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(f'{self.base_url}/users/{self.user.id}/roles', {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, {'permission_ids': permission_id})
+        self.assertEqual(response.data, {permission_id: True})
+
+
+    def test_user_permissions_exact_id_matching(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(f'{self.base_url}/users/{self.user.id}/roles', {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        permission_id = Permission.objects.get(codename='add_user').id
+        url = f'{self.base_url}/users/{self.user.id}/permissions'
+        response = self.client.post(url, {'permission_ids': f'1{permission_id}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {f'1{permission_id}': False})
+
+        response = self.client.post(url, {'permission_ids': f'{permission_id},²,x'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {str(permission_id): True, '²': False, 'x': False})
+
+
+    def test_user_permissions_bulk_check(self):
+        url = f'{self.base_url}/roles'
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        other = User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+        response = self.client.post(f'{self.base_url}/users/{other.id}/roles', {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        add_user = Permission.objects.get(codename='add_user').id
+        view_site = Permission.objects.get(codename='view_site').id
+        missing_user = '00000000-0000-0000-0000-000000000000'
+        url = f'{self.base_url}/users/permissions/check'
+        data = {
+            'user_ids': [str(self.user.id), str(other.id), missing_user],
+            'permission_ids': [add_user, view_site],
+            'codenames': ['users.add_user', 'view_site'],
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            str(self.user.id): {str(add_user): False, str(view_site): False,
+                                'users.add_user': False, 'view_site': False},
+            str(other.id): {str(add_user): True, str(view_site): False,
+                            'users.add_user': True, 'view_site': False},
+            missing_user: None,
+        })
+
+
+    def test_user_permissions_bulk_check_without_permissions(self):
+        url = f'{self.base_url}/users/permissions/check'
+        response = self.client.post(url, {'user_ids': [str(self.user.id)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
     def test_retrieve_specific_user_permissions_without_providing_permission_ids(self):
         # Retrieve user permissions
         url = f'{self.base_url}/users/{self.user.id}/permissions'
@@ -208,3 +712,184 @@ class AuthTest(APITestCase):
         url_ = f'{self.base_url}/users/{self.user.id}/roles'
         response_ = self.client.post(url_)
         self.assertEqual(response_.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_token_authentication_is_cached(self):
+        url = f'{self.base_url}/roles'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql']])
+
+
+    def test_logout_invalidates_cached_token(self):
+        url = f'{self.base_url}/roles'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.delete(f'{self.base_url}/logout')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    def test_deactivated_user_cached_token_rejected(self):
+        url = f'{self.base_url}/roles'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    @override_settings(AUTH_TOKEN_MODE='signed', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_signed_tokens(self):
+        self.client.credentials()
+        url = f'{self.base_url}/login'
+        data = {'username': 'admin@admin.com', 'password': 'admin1234'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token_type'], 'Bearer')
+        claims = tokens.decode(response.data['access'])
+        self.assertEqual(claims['sub'], str(self.user.id))
+        self.assertEqual(claims['roles'], [])
+
+        url = f'{self.base_url}/token/refresh'
+        refresh = response.data['refresh']
+        response = self.client.post(url, {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], refresh)
+        access = response.data['access']
+
+        # A refresh token is single-use; reusing one ends its family.
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.refresh(refresh)
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.refresh(response.data['refresh'])
+
+        url = f'{self.base_url}/roles'
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'users_user' in q['sql']
+                          and 'auth_group' not in q['sql']])
+
+        header, claims_segment, signature = access.split('.')
+        for token in (f'{header}.{claims_segment}.{signature[::-1]}',
+                      tokens.encode({**claims, 'exp': 0})):
+            with self.assertRaises(tokens.InvalidToken):
+                tokens.decode(token)
+        with override_settings(AUTH_SIGNING_KEYS={'other': 'secret'}):
+            with self.assertRaises(tokens.InvalidToken):
+                tokens.decode(access)
+
+        # Logging out without `refresh` still ends the refresh tokens.
+        self.client.credentials()
+        response = self.client.post(f'{self.base_url}/login', data, format='json')
+        self.assertEqual(tokens.decode(response.data['access'])['fam'],
+                         str(RefreshToken.objects.latest('created_at').family))
+        refresh = response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        response = self.client.delete(f'{self.base_url}/logout')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.refresh(refresh)
+
+        RefreshToken.objects.filter(family=tokens.decode(access)['fam']) \
+            .update(expires_at=timezone.now())
+        call_command('purge_refresh_tokens', stdout=StringIO())
+        self.assertEqual(RefreshToken.objects.count(), 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+        response = self.client.delete(f'{self.base_url}/logout')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_token_introspection(self):
+        data = {'permission_codename': 'add_user', 'role_name': 'SysAdmin'}
+        response = self.client.post(f'{self.base_url}/roles', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = f'{self.base_url}/users/{self.user.id}/roles'
+        response = self.client.post(url, {'roles': 'SysAdmin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        inactive = User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+        inactive_token = Token.objects.create(user=inactive)
+        inactive.is_active = False
+        inactive.save()
+
+        url = f'{self.base_url}/token/introspect'
+        access = tokens.issue_access_token(self.user)
+        data = {'tokens': [self.token.key, access, 'unknown', inactive_token.key]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=30', response['Cache-Control'])
+        result = response.data[0]
+        self.assertEqual(result['user_id'], str(self.user.id))
+        self.assertEqual(result['roles'], ['SysAdmin'])
+        self.assertIn('users.add_user', result['permissions'])
+        self.assertIsNone(result['exp'])
+        self.assertEqual(response.data[1]['permissions'], result['permissions'])
+        self.assertIsNotNone(response.data[1]['exp'])
+        self.assertEqual(response.data[2:], [{'active': False}] * 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the tokens that resolved to no active user are looked up again.
+        self.assertEqual(len(queries), 1)
+        self.assertIn('authtoken_token', queries[0]['sql'])
+
+        response = self.client.post(url, {'token': access}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_id'], str(self.user.id))
+
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_health_checks(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['checks']['database'], 'ok')
+
+
+    def test_transaction_policy(self):
+        url = f'{self.base_url}/roles'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'SAVEPOINT' in q['sql']])
+
+        data = {'permission_codename': 'add_user', 'role_name': 'Auditor'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue([q for q in queries if 'SAVEPOINT' in q['sql']])
+
+
+    def test_transaction_report(self):
+        from utils.transactions import get_transaction_report
+
+        report = {route: (atomic, autocommit)
+                  for route, _, atomic, autocommit in get_transaction_report()}
+        self.assertEqual(report['api/roles'], (['post'], ['get']))
+        self.assertEqual(report['api/users/permissions/check'], ([], ['post']))
+        self.assertEqual(report['api/signup'], (['post'], []))
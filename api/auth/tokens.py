@@ -0,0 +1,210 @@
+"""
+Signed access tokens and rotating refresh tokens, issued on login when
+AUTH_TOKEN_MODE is 'signed'.
+
+Access tokens are JWTs signed with HMAC-SHA256 by one of
+AUTH_SIGNING_KEYS, named in their `kid` header, so any service holding
+the keys verifies them locally. They carry the user id (`sub`), the ids
+of the user's roles (`roles`) and a digest of their effective permission
+ids (`pv`, see `rbac.get_permission_version`) and the id of their
+refresh token family (`fam`), and expire after
+AUTH_ACCESS_TOKEN_LIFETIME seconds. Revoked access tokens are denylisted
+by `jti` in the shared cache until they would have expired.
+
+Refresh tokens are opaque and stored hashed (users.RefreshToken). Each
+is single-use: refreshing replaces it with the next token of its family.
+Presenting a used token again revokes the whole family, since one of
+the two holders must have stolen it.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from users import rbac
+from users.models import RefreshToken
+
+ALGORITHM = 'HS256'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _encode_segment(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _decode_segment(segment):
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def _sign(kid, signing_input):
+    key = settings.AUTH_SIGNING_KEYS[kid].encode()
+    return hmac.new(key, signing_input.encode(), hashlib.sha256).digest()
+
+
+def encode(claims):
+    kid = settings.AUTH_SIGNING_KEY_ID
+    header = {'alg': ALGORITHM, 'typ': 'JWT', 'kid': kid}
+    signing_input = '.'.join(
+        _encode_segment(json.dumps(part, separators=(',', ':')).encode())
+        for part in (header, claims))
+    return f'{signing_input}.{_encode_segment(_sign(kid, signing_input))}'
+
+
+def decode(token):
+    """
+    Returns the claims of a valid, unexpired access token signed with any
+    of AUTH_SIGNING_KEYS. Raises InvalidToken otherwise.
+    """
+    try:
+        header_segment, claims_segment, signature = token.split('.')
+        header = json.loads(_decode_segment(header_segment))
+        kid = header['kid']
+        if (header['alg'] != ALGORITHM
+                or kid not in settings.AUTH_SIGNING_KEYS):
+            raise InvalidToken('Unknown signing key.')
+
+        expected = _sign(kid, f'{header_segment}.{claims_segment}')
+        if not hmac.compare_digest(expected, _decode_segment(signature)):
+            raise InvalidToken('Invalid signature.')
+        claims = json.loads(_decode_segment(claims_segment))
+        expires_at = claims['exp']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken('Malformed token.')
+
+    if expires_at <= time.time():
+        raise InvalidToken('Expired token.')
+    return claims
+
+
+def _denylist_key(jti):
+    return f'auth:denylist:{jti}'
+
+
+def revoke_access_token(claims):
+    # Only kept while the token could still be presented.
+    remaining = int(claims['exp'] - time.time()) + 1
+    if remaining > 0:
+        cache.set(_denylist_key(claims['jti']), 1, remaining)
+
+
+def is_revoked(claims):
+    return cache.get(_denylist_key(claims['jti'])) is not None
+
+
+def get_revoked(jtis):
+    """
+    Returns the subset of the token ids `jtis` that are denylisted.
+    """
+    keys = {_denylist_key(jti): jti for jti in jtis}
+    return {keys[key] for key in cache.get_many(list(keys))} if keys else set()
+
+
+def issue_access_token(user, family=None):
+    grants = rbac.get_user_grants_many([user.pk]).get(str(user.pk))
+    permission_ids = rbac.get_effective_permission_ids(user.pk) or ()
+    now = int(time.time())
+    claims = {
+        'sub': str(user.pk),
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': now + settings.AUTH_ACCESS_TOKEN_LIFETIME,
+        'roles': sorted(grants.group_ids) if grants else [],
+        'pv': rbac.get_permission_version(permission_ids),
+    }
+    if family is not None:
+        claims['fam'] = str(family)
+    return encode(claims)
+
+
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_tokens(user, family=None):
+    """
+    Issues an access token and a refresh token of `family` (a new family
+    by default) and returns the login payload.
+    """
+    refresh_token = secrets.token_urlsafe(32)
+    family = family or uuid.uuid4()
+    RefreshToken.objects.create(
+        user=user,
+        family=family,
+        token_hash=_hash_refresh_token(refresh_token),
+        expires_at=timezone.now() + timedelta(
+            seconds=settings.AUTH_REFRESH_TOKEN_LIFETIME))
+
+    return {
+        'access': issue_access_token(user, family),
+        'refresh': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': settings.AUTH_ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def revoke_family(family):
+    RefreshToken.objects.filter(family=family, revoked_at__isnull=True) \
+        .update(revoked_at=timezone.now())
+
+
+def _use_refresh_token(token):
+    now = timezone.now()
+    try:
+        refresh_token = (RefreshToken.objects.select_for_update()
+                         .select_related('user')
+                         .get(token_hash=_hash_refresh_token(token)))
+    except RefreshToken.DoesNotExist:
+        return None, 'Invalid refresh token.'
+
+    if refresh_token.used_at is not None or refresh_token.revoked_at:
+        revoke_family(refresh_token.family)
+        return None, 'Refresh token already used.'
+    if refresh_token.expires_at <= now or not refresh_token.user.is_active:
+        return None, 'Expired refresh token.'
+
+    refresh_token.used_at = now
+    refresh_token.save(update_fields=['used_at'])
+    return refresh_token, None
+
+
+def refresh(token):
+    """
+    Trades a refresh token for new tokens of the same family. Raises
+    InvalidToken for unknown, expired or reused tokens; a reuse revokes
+    the family, and that is committed before raising.
+    """
+    with transaction.atomic():
+        refresh_token, error = _use_refresh_token(token)
+        if refresh_token is not None:
+            return issue_tokens(refresh_token.user, refresh_token.family)
+
+    raise InvalidToken(error)
+
+
+def revoke(claims, refresh_token=None):
+    """
+    Logs a signed-token session out: denylists the access token and
+    revokes its refresh token family, and that of `refresh_token` when
+    given.
+    """
+    revoke_access_token(claims)
+    families = {claims['fam']} if 'fam' in claims else set()
+    if refresh_token:
+        families.update(RefreshToken.objects
+                        .filter(token_hash=_hash_refresh_token(refresh_token),
+                                user_id=claims['sub'])
+                        .values_list('family', flat=True))
+    for family in families:
+        revoke_family(family)
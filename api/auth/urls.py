@@ -1,11 +1,16 @@
 from django.urls import path
-from .views import (SignUpView, LoginView, LogoutView, PermissionsView, RolesView)
+from .views import (SignUpView, LoginView, LogoutView, PermissionsView, RolesView,
+                    MetricsView, TokenRefreshView, IntrospectionView)
 
 
 urlpatterns = [
     path('signup', SignUpView.as_view(), name='user_signup'),
     path('login', LoginView.as_view(), name='user_login'),
     path('logout', LogoutView.as_view(), name='user_logout'),
+    path('token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/introspect', IntrospectionView.as_view(),
+         name='token_introspect'),
     path('permissions', PermissionsView.as_view(), name='user_permissions'),
     path('roles', RolesView.as_view(), name='user_roles'),
+    path('metrics', MetricsView.as_view(), name='service_metrics'),
 ]
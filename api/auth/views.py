@@ -1,10 +1,11 @@
 from datetime import datetime
 
 from django.contrib import messages
-from django.contrib.auth import get_user_model
+from django.contrib.auth import get_user_model, user_logged_out
 from django.contrib.auth.models import Permission, Group
 from django.contrib.contenttypes.models import ContentType
 from django.urls.exceptions import NoReverseMatch
+from django.utils.cache import patch_cache_control
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic.base import TemplateView
 from django.shortcuts import redirect
@@ -13,19 +14,25 @@ from django.db import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
 
 from rest_framework import generics, permissions, status, views
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
-from djoser import utils, signals
+from djoser import utils
 from djoser.conf import settings
 
 from config import exceptions
-from . import serializers
+from users import rbac
+from utils import metrics
+from utils.http import make_etag, not_modified, set_validators
+from utils.transactions import TransactionPolicyMixin
+from . import (authentication, introspection, serializers, services,
+               tokens)
 
 User = get_user_model()
 
 
-class AuthApiListView(views.APIView):
+class AuthApiListView(TransactionPolicyMixin, views.APIView):
     permission_classes = [permissions.AllowAny]
 
     @staticmethod
@@ -55,41 +62,139 @@ class AuthApiListView(views.APIView):
 class SignUpView(generics.CreateAPIView):
     serializer_class = serializers.SignUpSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'signup'
 
     def perform_create(self, serializer):
-        user = serializer.save()
-        signals.user_registered.send(sender=self.__class__, user=user,
-                                     request=self.request)
+        services.register_user(self.request, serializer)
 
-class LoginView(utils.ActionViewMixin, generics.GenericAPIView):
+class LoginView(TransactionPolicyMixin, utils.ActionViewMixin,
+                generics.GenericAPIView):
     serializer_class = serializers.LoginSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
+    # Each write stands on its own, and a failed login must not roll back
+    # its audit event.
+    atomic_methods = ()
 
     def _action(self, serializer):
-        token = utils.login_user(self.request, serializer.user)
-        token_serializer_class = serializers.TokenSerializer
-        data = {"token":token_serializer_class(token).data,
-            "userid":serializer.user.id,
-            "username": serializer.user.username
-        }
+        data = services.login_user(self.request, serializer.user)
         return Response(data = data)
 
 
+class TokenRefreshView(TransactionPolicyMixin, utils.ActionViewMixin,
+                       generics.GenericAPIView):
+    serializer_class = serializers.TokenRefreshSerializer
+    permission_classes = [permissions.AllowAny]
+    # A reused refresh token revokes its family, which must be committed
+    # even though the request fails.
+    atomic_methods = ()
+
+    def _action(self, serializer):
+        try:
+            data = tokens.refresh(serializer.validated_data['refresh'])
+        except tokens.InvalidToken as e:
+            raise AuthenticationFailed(str(e))
+        return Response(data=data)
+
+
+class IntrospectionView(TransactionPolicyMixin, generics.GenericAPIView):
+    """
+    Resolves a `token`, or a batch of `tokens`, to the user's id, roles
+    and permission codenames for gateways. `Cache-Control: max-age` tells
+    the caller how long it may reuse the answer.
+    """
+    serializer_class = serializers.IntrospectionSerializer
+    permission_classes = [permissions.IsAdminUser]
+    # A read, whatever the method; and gateways call it for every
+    # upstream request.
+    atomic_methods = ()
+    throttle_classes = ()
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data.get('token')
+        token_list = ([token] if token is not None
+                      else serializer.validated_data['tokens'])
+
+        results, max_age = introspection.introspect(token_list)
+        response = Response(results[0] if token is not None else results)
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response
+
+
 class LogoutView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @staticmethod
     def delete(request):
+        if isinstance(request.successful_authenticator,
+                      authentication.SignedTokenAuthentication):
+            # Signed tokens stay valid until they expire unless denylisted,
+            # and their refresh token family until it is revoked.
+            tokens.revoke(request.auth, request.data.get('refresh'))
+            user_logged_out.send(sender=request.user.__class__,
+                                 request=request, user=request.user)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.auth is not None:
+            authentication.invalidate_token(request.auth.key)
         utils.logout_user(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class PermissionsView(utils.ActionViewMixin, generics.GenericAPIView):
+class MetricsView(TransactionPolicyMixin, views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class CatalogViewMixin(object):
+    """
+    Serves a part of the cached RBAC catalog (see `rbac.get_catalog`)
+    with an ETag, answering 304 while it has not changed. `?search=`
+    filters by name and `?limit=` (with `?offset=`) paginates.
+    """
+
+    def get_catalog_items(self, catalog):
+        raise NotImplementedError
+
+    def get_item_name(self, item):
+        return item
+
+    def render_items(self, items):
+        return list(items)
+
+    def get(self, request):
+        catalog = rbac.get_catalog()
+        etag = make_etag(catalog.etag, sorted(request.query_params.lists()))
+        response = not_modified(request, etag=etag)
+        if response is not None:
+            return response
+
+        items = self.get_catalog_items(catalog)
+        search = request.query_params.get('search', '').lower()
+        if search:
+            items = [item for item in items
+                     if search in self.get_item_name(item).lower()]
+
+        if self.paginator.limit_query_param in request.query_params:
+            page = self.paginate_queryset(items)
+            response = self.get_paginated_response(self.render_items(page))
+        else:
+            response = Response(self.render_items(items))
+
+        return set_validators(response, etag)
+
+
+class PermissionsView(TransactionPolicyMixin, CatalogViewMixin,
+                      utils.ActionViewMixin, generics.GenericAPIView):
     serializer_class = serializers.CreatePermissionsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
-        return Response(User(is_superuser=True).get_all_permissions())
+    def get_catalog_items(self, catalog):
+        return catalog.permissions
 
     def _action(self, serializer):
         codename = serializer.data['codename']
@@ -111,12 +216,19 @@ class PermissionsView(utils.ActionViewMixin, generics.GenericAPIView):
 
         return Response(data=content, status=status.HTTP_201_CREATED)
 
-class RolesView(utils.ActionViewMixin, generics.GenericAPIView):
+class RolesView(TransactionPolicyMixin, CatalogViewMixin,
+                utils.ActionViewMixin, generics.GenericAPIView):
     serializer_class = serializers.CreateRolesSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
-        return Response({group.name: group.id for group in Group.objects.all()})
+    def get_catalog_items(self, catalog):
+        return catalog.roles
+
+    def get_item_name(self, item):
+        return item[0]
+
+    def render_items(self, items):
+        return dict(items)
 
     def _action(self, serializer):
         codename = serializer.data['permission_codename']
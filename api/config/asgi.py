@@ -0,0 +1,22 @@
+"""
+ASGI config for api project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``, e.g. for ``gunicorn -k uvicorn.workers.UvicornWorker``.
+Django < 3.0 has no native ASGI handler, so the WSGI application is
+adapted with asgiref there.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+try:
+    from django.core.asgi import get_asgi_application
+except ImportError:
+    from asgiref.wsgi import WsgiToAsgi
+    from django.core.wsgi import get_wsgi_application
+
+    application = WsgiToAsgi(get_wsgi_application())
+else:
+    application = get_asgi_application()
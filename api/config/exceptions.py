@@ -25,6 +25,11 @@ class ServiceUnavailable(APIException):
         'Service temporarily unavailable, please try again later.')
     default_code = 'service_unavailable'
 
+    def __init__(self, detail=None, code=None, wait=None):
+        # DRF's exception handler turns `wait` into a Retry-After header.
+        super().__init__(detail, code)
+        self.wait = wait
+
 
 class AlreadyProcessed(APIException):
     status_code = status.HTTP_409_CONFLICT
@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for serving config.wsgi in production.
+
+    gunicorn -c api/config/gunicorn.py
+
+Every setting can be overridden from the environment. The app is loaded
+once in the master and then forked (`preload_app`), so workers start
+warm and share the imported code copy-on-write. Send HUP to the master
+to gracefully replace the workers; with preloading enabled, new code is
+only picked up by a USR2 (new master) followed by QUIT to the old one.
+"""
+import multiprocessing
+import os
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+chdir = API_DIR
+wsgi_app = os.environ.get('GUNICORN_APP', 'config.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+workers = _env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+threads = _env_int('GUNICORN_THREADS', 1)
+worker_class = os.environ.get(
+    'GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers periodically to bound memory growth; the jitter keeps
+# them from all restarting at once.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 10000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 1000)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Sockets opened in the master while preloading must not be shared
+    # between workers.
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+
+
+def when_ready(server):
+    # With the app preloaded, Django is set up in the master; log which
+    # endpoints run inside a transaction once at startup.
+    if not server.cfg.preload_app:
+        return
+
+    from utils import transactions
+
+    rows = transactions.get_transaction_report()
+    server.log.info('Transactional endpoints:\n%s',
+                    transactions.format_transaction_report(
+                        [row for row in rows if row[2]]))
@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+
+
+@never_cache
+@transaction.non_atomic_requests
+def liveness(request):
+    """
+    The process is up and serving requests; checks no dependencies.
+    """
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@transaction.non_atomic_requests
+def readiness(request):
+    """
+    The worker can serve traffic: the database answers. The cache is
+    reported but does not fail the check, as the app degrades without it.
+    """
+    checks = {}
+    try:
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except DatabaseError:
+        checks['database'] = 'unavailable'
+
+    try:
+        cache.client.get_client().ping()
+        checks['cache'] = 'ok'
+    except Exception:
+        checks['cache'] = 'unavailable'
+
+    ready = checks['database'] == 'ok'
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': checks},
+        status=200 if ready else 503)
@@ -1,7 +1,9 @@
+import hashlib
 import logging
 import environ
 from django.utils.translation import gettext_lazy as _
 import os
+import sys
 
 # Project Base Paths
 # project_root/api/config/settings.py - 3 = project_root/
@@ -12,6 +14,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Load OS environment variables and then prepare to use them
 env = environ.Env()
 DJANGO_ENV = env.str('DJANGO_ENV', default='development')
+TESTING = sys.argv[1:2] == ['test']
 
 # Loading .env file from root directory to set environment.
 # OS Environment variables have precedence over variables defined
@@ -19,11 +22,9 @@ DJANGO_ENV = env.str('DJANGO_ENV', default='development')
 # will only be used if not defined as environment variables.
 env_file = ROOT_DIR('.env')
 env.read_env(env_file)
-DEBUG = True
-if DJANGO_ENV == 'development':
-    # SECURITY WARNING: don't run with debug turned on in production!
-    # https://docs.djangoproject.com/en/2.0/ref/settings/#std:setting-DEBUG
-    pass
+# SECURITY WARNING: don't run with debug turned on in production!
+# https://docs.djangoproject.com/en/2.0/ref/settings/#std:setting-DEBUG
+DEBUG = env.bool('DJANGO_DEBUG', default=True)
 # SECURITY WARNING: keep the secret key used in production secret!
 # Raises ImproperlyConfigured exception if DJANGO_SECRET_KEY not in os.environ
 # https://docs.djangoproject.com/en/2.0/ref/settings/#secret-key
@@ -65,18 +66,25 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES':
     ('rest_framework.permissions.DjangoModelPermissions', ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'auth.authentication.CachedTokenAuthentication',
+        'auth.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_THROTTLE_CLASSES': (
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'utils.throttling.AnonRateThrottle',
+        'utils.throttling.UserRateThrottle',
+        'utils.throttling.ScopedRateThrottle',
     ),
     'DEFAULT_THROTTLE_RATES': {
         'anon': env.str(
             'DJANGO_DEFAULT_THROTTLE_RATE_ANON', default='60/minute'),
         'user': env.str(
             'DJANGO_DEFAULT_THROTTLE_RATE_USER', default='120/minute'),
+        # Per-endpoint scopes (`throttle_scope`), per user or IP address;
+        # `read` covers the safe requests of every other view.
+        'login': env.str('DJANGO_THROTTLE_RATE_LOGIN', default='30/minute'),
+        'signup': env.str('DJANGO_THROTTLE_RATE_SIGNUP', default='10/minute'),
+        'read': env.str('DJANGO_THROTTLE_RATE_READ', default=None),
     },
     'DEFAULT_PAGINATION_CLASS':
     'rest_framework.pagination.LimitOffsetPagination',
@@ -88,6 +96,10 @@ REST_FRAMEWORK = {
     ),
     'EXCEPTION_HANDLER':
     'config.exceptions.api_exception_handler',
+    # The number of reverse proxies in front of the app. Throttles and the
+    # login gate identify clients by the address that many hops back in
+    # X-Forwarded-For; 0 ignores the client-controlled header altogether.
+    'NUM_PROXIES': env.int('DJANGO_NUM_PROXIES', default=0),
 }
 
 # Djoser Auth Related Settings
@@ -102,6 +114,8 @@ DJOSER = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves the collected static files, with DEBUG off as well.
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -151,6 +165,52 @@ DATABASES['default']['ATOMIC_REQUESTS'] = True
 DATABASES['default']['CONN_MAX_AGE'] = env.int(
     'DATABASE_CONN_MAX_AGE', default=0)
 
+# Connection pooling. Production checks connections out of a per-worker
+# pool (utils.db.backends.postgresql_pool); size it to the worker's
+# threads. Behind PgBouncer in transaction mode, leave pooling to it and
+# keep Django from opening server-side cursors, which cannot outlive a
+# transaction there.
+DATABASE_PGBOUNCER = env.bool('DATABASE_PGBOUNCER', default=False)
+DATABASE_POOL_ENABLED = env.bool(
+    'DATABASE_POOL_ENABLED',
+    default=DJANGO_ENV == 'production' and not DATABASE_PGBOUNCER)
+if DATABASE_POOL_ENABLED:
+    DATABASES['default']['ENGINE'] = 'utils.db.backends.postgresql_pool'
+    # Connections go back to the pool when Django closes them at the end
+    # of each request; a persistent one would hold its slot.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'SIZE': env.int('DATABASE_POOL_SIZE', default=10),
+        'TIMEOUT': env.float('DATABASE_POOL_TIMEOUT', default=10),
+        'HEALTH_CHECK_INTERVAL': env.float(
+            'DATABASE_POOL_HEALTH_CHECK_INTERVAL', default=30),
+        'MAX_LIFETIME': env.float('DATABASE_POOL_MAX_LIFETIME', default=1800),
+    }
+if DATABASE_PGBOUNCER:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replicas. Reads of the users/auth tables outside of transactions go
+# to a replica lagging at most DATABASE_REPLICA_MAX_LAG seconds, otherwise
+# to the primary (utils.db.routers.ReplicaRouter).
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[])):
+    alias = f'replica_{index}'
+    DATABASES[alias] = env.db_url_config(replica_url)
+    for key in ('ENGINE', 'CONN_MAX_AGE', 'POOL', 'DISABLE_SERVER_SIDE_CURSORS'):
+        if key in DATABASES['default']:
+            DATABASES[alias][key] = DATABASES['default'][key]
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_REPLICA_MAX_LAG = env.float('DATABASE_REPLICA_MAX_LAG', default=5)
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = env.float(
+    'DATABASE_REPLICA_LAG_CHECK_INTERVAL', default=5)
+# How long a client reads from the primary after writing
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=10)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['utils.db.routers.ReplicaRouter']
+    MIDDLEWARE.insert(1, 'utils.db.middleware.ReplicaPinningMiddleware')
+
 # Caching Settings
 # https://docs.djangoproject.com/en/2.0/topics/cache/
 
@@ -168,6 +228,95 @@ CACHES = {
     }
 }
 
+# Sessions (dashboard): 'db' keeps them in the django_session table,
+# 'cache' in the cache above (utils.sessions), 'signed_cookies' in the
+# client's cookie, so no server-side storage at all; those can only be
+# revoked by expiring, keep SESSION_COOKIE_AGE short with them.
+SESSION_STORE = env.str('SESSION_STORE', default='db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'utils.sessions',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_STORE]
+SESSION_COOKIE_AGE = env.int('SESSION_COOKIE_AGE', default=14 * 24 * 3600)
+# With SESSION_STORE=cache, sessions still in the table are moved to the
+# cache when next used
+SESSION_DB_FALLBACK = env.bool('SESSION_DB_FALLBACK', default=True)
+
+# Throttling falls back to per-process limits (at most this many keys)
+# while redis is unreachable, and retries redis after this many seconds
+THROTTLE_LOCAL_MAXSIZE = env.int('THROTTLE_LOCAL_MAXSIZE', default=10000)
+THROTTLE_REDIS_RETRY_INTERVAL = env.int(
+    'THROTTLE_REDIS_RETRY_INTERVAL', default=5)
+
+# Process-local cache tier in front of redis. Its timeout bounds how long
+# other workers can serve an entry after it has been invalidated.
+LOCAL_CACHE_TIMEOUT = env.int('LOCAL_CACHE_TIMEOUT', default=5)
+
+# Token -> user resolution cache used by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', default=300)
+AUTH_TOKEN_LOCAL_CACHE_SIZE = env.int(
+    'AUTH_TOKEN_LOCAL_CACHE_SIZE', default=10000)
+
+# Pre-authentication login gate (auth.gate): failures per account, client
+# address and network prefix over a sliding window, after which attempts
+# are delayed progressively, then locked out
+AUTH_GATE_WINDOW = env.int('AUTH_GATE_WINDOW', default=900)
+AUTH_GATE_MAX_DELAY = env.int('AUTH_GATE_MAX_DELAY', default=300)
+AUTH_GATE_ACCOUNT_DELAY_AFTER = env.int(
+    'AUTH_GATE_ACCOUNT_DELAY_AFTER', default=5)
+AUTH_GATE_ACCOUNT_LOCKOUT_AFTER = env.int(
+    'AUTH_GATE_ACCOUNT_LOCKOUT_AFTER', default=20)
+AUTH_GATE_IP_DELAY_AFTER = env.int('AUTH_GATE_IP_DELAY_AFTER', default=10)
+AUTH_GATE_IP_LOCKOUT_AFTER = env.int('AUTH_GATE_IP_LOCKOUT_AFTER', default=100)
+AUTH_GATE_PREFIX_DELAY_AFTER = env.int(
+    'AUTH_GATE_PREFIX_DELAY_AFTER', default=50)
+AUTH_GATE_PREFIX_LOCKOUT_AFTER = env.int(
+    'AUTH_GATE_PREFIX_LOCKOUT_AFTER', default=500)
+
+# Login token mode: 'opaque' issues authtoken tokens, 'signed' issues
+# short-lived signed access tokens and rotating refresh tokens (auth.tokens)
+AUTH_TOKEN_MODE = env.str('AUTH_TOKEN_MODE', default='opaque')
+# Signing keys as comma-separated `kid:secret` pairs. New tokens are signed
+# with AUTH_SIGNING_KEY_ID (the first key by default); keep retired keys
+# listed until the tokens they signed have expired.
+AUTH_SIGNING_KEYS = dict(
+    pair.split(':', 1) for pair in env.list('AUTH_SIGNING_KEYS', default=[
+        'default:' + hashlib.sha256(
+            f'auth.tokens:{SECRET_KEY}'.encode()).hexdigest()]))
+AUTH_SIGNING_KEY_ID = env.str(
+    'AUTH_SIGNING_KEY_ID', default=next(iter(AUTH_SIGNING_KEYS)))
+AUTH_ACCESS_TOKEN_LIFETIME = env.int('AUTH_ACCESS_TOKEN_LIFETIME', default=300)
+AUTH_REFRESH_TOKEN_LIFETIME = env.int(
+    'AUTH_REFRESH_TOKEN_LIFETIME', default=30 * 24 * 3600)
+# Active users resolved from signed access tokens
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=300)
+# Token introspection (auth.introspection): tokens per request, and for
+# how long gateways may reuse a result
+AUTH_INTROSPECTION_MAX_TOKENS = env.int(
+    'AUTH_INTROSPECTION_MAX_TOKENS', default=100)
+AUTH_INTROSPECTION_MAX_AGE = env.int('AUTH_INTROSPECTION_MAX_AGE', default=30)
+
+# Effective permission sets (users.rbac), invalidated through m2m signals
+RBAC_CACHE_TIMEOUT = env.int('RBAC_CACHE_TIMEOUT', default=3600)
+RBAC_LOCAL_CACHE_SIZE = env.int('RBAC_LOCAL_CACHE_SIZE', default=10000)
+RBAC_BULK_CHECK_MAX_USERS = env.int('RBAC_BULK_CHECK_MAX_USERS', default=500)
+RBAC_BULK_CHECK_MAX_PERMISSIONS = env.int(
+    'RBAC_BULK_CHECK_MAX_PERMISSIONS', default=1000)
+USER_ROLES_BULK_MAX_USERS = env.int('USER_ROLES_BULK_MAX_USERS', default=5000)
+
+# Bulk user import API, see users.importing. Plain passwords are hashed by
+# this many processes per request (0 for one per CPU); prefer pre-hashed
+# passwords or the import_users command for large imports.
+USER_IMPORT_BATCH_SIZE = env.int('USER_IMPORT_BATCH_SIZE', default=1000)
+USER_IMPORT_HASH_WORKERS = env.int('USER_IMPORT_HASH_WORKERS', default=1)
+# Users per query (plus one for their roles) of the streaming export
+USER_EXPORT_CHUNK_SIZE = env.int('USER_EXPORT_CHUNK_SIZE', default=2000)
+
+# Per-user dashboard permission listing
+DASHBOARD_CACHE_TIMEOUT = env.int('DASHBOARD_CACHE_TIMEOUT', default=3600)
+DASHBOARD_LOCAL_CACHE_SIZE = env.int('DASHBOARD_LOCAL_CACHE_SIZE', default=1000)
+
 # Custom User Model
 # https://docs.djangoproject.com/en/2.0/topics/auth/customizing/#substituting-a-custom-user-model
 
@@ -195,9 +344,38 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. The first hasher of the strategy hashes new passwords;
+# the others still verify existing hashes, which are upgraded on login.
+PASSWORD_HASHER_STRATEGY = env.str('PASSWORD_HASHER_STRATEGY', default='argon2id')
+PASSWORD_HASHER_STRATEGIES = {
+    'argon2id': 'auth.hashers.Argon2idPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_STRATEGIES[PASSWORD_HASHER_STRATEGY]] + [
+    hasher for name, hasher in PASSWORD_HASHER_STRATEGIES.items()
+    if name != PASSWORD_HASHER_STRATEGY
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+# Argon2id costs: 19 MiB, 2 passes, 1 lane (OWASP's baseline)
+PASSWORD_ARGON2_TIME_COST = env.int('PASSWORD_ARGON2_TIME_COST', default=2)
+PASSWORD_ARGON2_MEMORY_COST = env.int(
+    'PASSWORD_ARGON2_MEMORY_COST', default=19456)
+PASSWORD_ARGON2_PARALLELISM = env.int('PASSWORD_ARGON2_PARALLELISM', default=1)
+# 'thread' or 'process' hash on a pool of PASSWORD_HASHING_POOL_SIZE
+# workers per process (0: CPU count), 'none' on the request thread.
+# argon2 releases the GIL, so threads hash in parallel too.
+# Beyond PASSWORD_HASHING_MAX_PENDING running or queued hashes per process,
+# logins and signups fail fast with 503 and Retry-After.
+PASSWORD_HASHING_POOL = env.str('PASSWORD_HASHING_POOL', default='thread')
+PASSWORD_HASHING_POOL_SIZE = env.int('PASSWORD_HASHING_POOL_SIZE', default=1)
+PASSWORD_HASHING_MAX_PENDING = env.int(
+    'PASSWORD_HASHING_MAX_PENDING', default=4)
+PASSWORD_HASHING_RETRY_AFTER = env.int(
+    'PASSWORD_HASHING_RETRY_AFTER', default=1)
+
+# EmailOrUsernameModelBackend extends ModelBackend, so it also serves the
+# admin login and model permissions; listing both would authenticate twice.
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'auth.backends.EmailOrUsernameModelBackend'
+    'auth.backends.EmailOrUsernameModelBackend',
 ]
 
 # Sites Framework
@@ -231,6 +409,10 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
+# Filled by `manage.py collectstatic` when the container starts and
+# served, compressed, by WhiteNoise.
+STATIC_ROOT = API_DIR('staticfiles')
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
 # User uploaded media files
 # https://docs.djangoproject.com/en/2.0/topics/files/
@@ -251,11 +433,24 @@ API_BROWSER_HEADER = env.str('API_BROWSER_HEADER')
 # http://docs.celeryproject.org/en/latest/django/first-steps-with-django.html
 
 CELERY_BROKER_URL = REDIS_LOCATION
-CELERY_RESULT_BACKEND = 'django-db'
+CELERY_RESULT_BACKEND = env.str('CELERY_RESULT_BACKEND', default=None)
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Side-effect tasks return nothing worth storing.
+CELERY_TASK_IGNORE_RESULT = True
+# Without a worker (development, tests) tasks run in-process within the
+# request; queued tasks also do when the broker is down. The deployments
+# run a worker and turn this off; tests always run tasks in-process.
+CELERY_TASK_ALWAYS_EAGER = TESTING or env.bool(
+    'CELERY_TASK_ALWAYS_EAGER', default=DJANGO_ENV != 'production')
+CELERY_BROKER_TRANSPORT_OPTIONS = {'max_retries': 1}
+CELERY_BROKER_CONNECTION_TIMEOUT = env.float(
+    'CELERY_BROKER_CONNECTION_TIMEOUT', default=1)
+
+# Repeated logins of a user within this many seconds update last_login once
+LAST_LOGIN_UPDATE_INTERVAL = env.int('LAST_LOGIN_UPDATE_INTERVAL', default=60)
 
 
 # Test Settings
@@ -8,6 +8,7 @@ from django.conf.urls.static import static
 from dashboard.views import ProcessLoginView, DashBoardView, UserLogoutView, UserSignUpView
 
 from auth.views import AuthApiListView
+from config import health
 from utils.router import DefaultRouterWithAPIViews
 
 admin.site.site_header = settings.ADMIN_SITE_HEADER
@@ -28,6 +29,8 @@ urlpatterns = [
     path('api/schema/', schema_view),
     path('api/browser/', api_browser_urls),
     path('api/admin/', admin.site.urls),
+    path('healthz', health.liveness, name='liveness'),
+    path('readyz', health.readiness, name='readiness'),
     path('', DashBoardView.as_view()),
     url(r'^login/?$', ProcessLoginView.as_view()),
     url(r'^dashboard/?$', DashBoardView.as_view()),
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.contrib.auth.models import Permission
+
+from users import rbac
+from utils.cache import TwoTierCache
+from utils.db.routers import use_primary
+
+permissions_cache = TwoTierCache(
+    'dashboard:permissions',
+    timeout=settings.DASHBOARD_CACHE_TIMEOUT,
+    local_maxsize=settings.DASHBOARD_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+
+
+def _load_role_permissions(user_id):
+    rows = (Permission.objects
+            .filter(group__user__id=user_id)
+            .values_list('id', 'codename', 'name', 'group__name')
+            .order_by('id', 'group__name'))
+
+    permissions = {}
+    for pk, codename, name, role in rows:
+        permission = permissions.setdefault(pk, {
+            'id': pk,
+            'codename': codename,
+            'name': name,
+            'roles': [],
+        })
+        permission['roles'].append(role)
+
+    return list(permissions.values())
+
+
+def _get_stamp(user_id):
+    """
+    What the cached entry of the user depends on: their roles, the
+    permissions of each, and the catalog version for renames. None when
+    the user does not exist.
+    """
+    grants = rbac.get_user_grants_many([user_id]).get(str(user_id))
+    if grants is None:
+        return None
+
+    group_permissions = rbac.get_group_permission_ids_many(grants.group_ids)
+    return (rbac.get_catalog_version(),
+            frozenset((group_id, group_permissions.get(str(group_id)))
+                      for group_id in grants.group_ids))
+
+
+def get_user_role_permissions(user_id):
+    """
+    Returns every permission the user holds through their roles, loaded
+    with a single join and cached per user.
+
+    Entries are stamped with the user's roles and their permission ids
+    from users.rbac, which the m2m receivers keep current, and with the
+    catalog version, bumped when a role or permission is saved or
+    deleted. An entry whose stamp no longer matches is rebuilt, so role
+    changes need no extra invalidation here. Without the shared cache
+    there is no catalog version, and renames show once the process-local
+    entry expires.
+    """
+    stamp = _get_stamp(user_id)
+    if stamp is None:
+        return []
+
+    entry = permissions_cache.get(str(user_id))
+    if entry is not None and entry['stamp'] == stamp:
+        return entry['permissions']
+
+    with use_primary():
+        permissions = _load_role_permissions(user_id)
+    permissions_cache.set(str(user_id), {
+        'stamp': stamp,
+        'permissions': permissions,
+    })
+
+    return permissions
@@ -0,0 +1,178 @@
+from io import StringIO
+
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.backends import db
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+from utils.sessions import SessionStore
+from utils.cache import clear_local_caches
+
+
+class DashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_caches()
+        self.user = User.objects.create_user('test@gmail.com', 'test1234test', username='test')
+
+    def test_login(self):
+        response = self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        self.assertRedirects(response, '/dashboard', fetch_redirect_response=False)
+        self.assertEqual(self.client.session['userid'], str(self.user.id))
+        self.assertTrue(self.client.session['token']['auth_token'])
+
+
+    @override_settings(AUTH_TOKEN_MODE='signed')
+    def test_signed_tokens(self):
+        role = Group.objects.create(name='SysAdmin')
+        role.permissions.add(Permission.objects.get(codename='add_user'))
+        self.user.groups.add(role)
+
+        response = self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        self.assertRedirects(response, '/dashboard', fetch_redirect_response=False)
+        response = self.client.get('/dashboard/')
+        self.assertEqual([p['codename'] for p in response.context['permissions']], ['add_user'])
+
+        # An expired access token is refreshed with the refresh token.
+        session = self.client.session
+        refresh_token = session['token']['refresh']
+        session['token']['access'] = 'expired'
+        session.save()
+        response = self.client.get('/dashboard/')
+        self.assertEqual([p['codename'] for p in response.context['permissions']], ['add_user'])
+        self.assertNotEqual(self.client.session['token']['refresh'], refresh_token)
+
+        # Reusing the old refresh token revoked the family.
+        session = self.client.session
+        session['token'] = {'access': 'expired', 'refresh': refresh_token}
+        session.save()
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['permissions'], [])
+
+
+    def test_login_invalid_credentials(self):
+        response = self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Unable to login with the provided credentials.', response.context['error_message'])
+
+
+    def test_signup(self):
+        data = {'username': 'new', 'email': 'new@gmail.com', 'password': 'test1234test'}
+        response = self.client.post('/signup/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('success_message', response.context)
+        self.assertTrue(User.objects.filter(email='new@gmail.com').exists())
+
+
+    def test_dashboard_permissions(self):
+        role = Group.objects.create(name='SysAdmin')
+        role.permissions.add(Permission.objects.get(codename='add_user'))
+        self.user.groups.add(role)
+
+        self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['codename'] for p in response.context['permissions']], ['add_user'])
+
+
+    def test_dashboard_lists_every_role_permission(self):
+        admin = Group.objects.create(name='SysAdmin')
+        admin.permissions.add(*Permission.objects.filter(codename__in=['add_user', 'change_user']))
+        normal = Group.objects.create(name='NormalUser')
+        normal.permissions.add(*Permission.objects.filter(codename__in=['view_site', 'add_user']))
+        self.user.groups.add(admin, normal)
+
+        self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        response = self.client.get('/dashboard/')
+        self.assertEqual({p['codename'] for p in response.context['permissions']},
+                         {'add_user', 'change_user', 'view_site'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/')
+        self.assertFalse([q for q in queries if 'auth_permission' in q['sql']])
+
+        normal.permissions.remove(Permission.objects.get(codename='view_site'))
+        response = self.client.get('/dashboard/')
+        self.assertEqual({p['codename'] for p in response.context['permissions']},
+                         {'add_user', 'change_user'})
+
+        # Changes that leave the effective permissions as they are.
+        def get_roles(codename):
+            response = self.client.get('/dashboard/')
+            return next(p['roles'] for p in response.context['permissions']
+                        if p['codename'] == codename)
+
+        self.user.groups.remove(normal)
+        self.assertEqual(get_roles('add_user'), ['SysAdmin'])
+        self.user.groups.add(normal)
+        self.assertEqual(get_roles('add_user'), ['NormalUser', 'SysAdmin'])
+
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_dashboard_role_renames(self):
+        role = Group.objects.create(name='SysAdmin')
+        role.permissions.add(Permission.objects.get(codename='add_user'))
+        self.user.groups.add(role)
+
+        self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['permissions'][0]['roles'], ['SysAdmin'])
+
+        role.name = 'Operator'
+        role.save()
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['permissions'][0]['roles'], ['Operator'])
+
+
+    @override_settings(SESSION_ENGINE='utils.sessions', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_sessions(self):
+        self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+        self.assertFalse(Session.objects.exists())
+
+        self.client.post('/logout/')
+        self.assertRedirects(self.client.get('/dashboard/'), '/login', fetch_redirect_response=False)
+
+
+    @override_settings(SESSION_ENGINE='utils.sessions', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_database_sessions_move_to_cache(self):
+        # Sessions stored before switching engines.
+        stores = [db.SessionStore(), db.SessionStore()]
+        for store in stores:
+            store['token'] = {'auth_token': Token.objects.get_or_create(user=self.user)[0].key}
+            store['userid'] = str(self.user.id)
+            store.create()
+        self.client.cookies['sessionid'] = stores[0].session_key
+
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Session.objects.count(), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/dashboard/')
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+
+        call_command('migrate_sessions', stdout=StringIO())
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(SessionStore(stores[1].session_key)['userid'], str(self.user.id))
+
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        self.client.post('/login/', {'username': 'test@gmail.com', 'password': 'test1234test'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+        self.assertFalse(Session.objects.exists())
@@ -1,19 +1,24 @@
-import requests
-
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import Permission
 from django.shortcuts import redirect, render
 from django.utils.translation import ugettext_lazy as _
 from django.views import View
 
-from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from auth import services as auth_services, tokens
+from auth.authentication import CachedTokenAuthentication, get_user
+from utils.transactions import TransactionPolicyMixin
+from . import services
 
 User = get_user_model()
 
 # Helper functions
-def construct_message(response_data):
+def construct_message(exc):
+    details = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
     messages = ""
-    for k,v in response_data.json().items():
+    for k,v in details.items():
+        if isinstance(v, list):
+            v = " ".join(str(message) for message in v)
         messages += f" {k}: {v}"
     return messages
 
@@ -29,22 +34,25 @@ class ProcessLoginView(View):
             return render(request, 'login.html')
 
     def post(self, request):
-        url = 'http://localhost:8000/api/login'
-        payload = {"username":request.POST.get("username"),"password": request.POST.get("password")}
-        response_data = requests.post(url, data=payload)
-
-        if response_data.status_code == status.HTTP_200_OK:
-            data = response_data.json()
-            request.session['token'] = data.get("token")
-            request.session['username'] = data.get("username")
-            request.session['userid'] = data.get("userid")
-            return redirect('/dashboard')
-        else:
+        try:
+            data = auth_services.login(request, request.POST.get("username"),
+                                       request.POST.get("password"))
+        except APIException as exc:
             message = {}
-            message['error_message'] = construct_message(response_data)
+            message['error_message'] = construct_message(exc)
             return render(request, "login.html", message)
 
-class DashBoardView(View):
+        if 'access' in data:
+            # AUTH_TOKEN_MODE=signed
+            request.session['token'] = {'access': data['access'],
+                                        'refresh': data['refresh']}
+        else:
+            request.session['token'] = dict(data.get("token"))
+        request.session['username'] = data.get("username")
+        request.session['userid'] = str(data.get("userid"))
+        return redirect('/dashboard')
+
+class DashBoardView(TransactionPolicyMixin, View):
     def get(self, request):
         if check_session_if_exists(request):
             permissions = self._get_user_roles_permissions(request)
@@ -56,32 +64,43 @@ class DashBoardView(View):
 
     def _get_user_roles_permissions(self, request):
         userid = request.session.get("userid")
-        url = f"http://localhost:8000/api/users/{userid}/roles"
-        headers={'Content-Type':'application/x-www-form-urlencoded', 'Authorization':f"Token {request.session.get('token').get('auth_token')}"}
-        response_data = requests.get(url, headers=headers)
-        if response_data.status_code == status.HTTP_200_OK:
-            data = response_data.json()
-            return self._get_user_permissions(data)
-        return []
+        # The session is only as good as the token it was issued with.
+        if not self._check_token(request, request.session.get('token') or {}):
+            return []
+        return services.get_user_role_permissions(userid)
 
     @staticmethod
-    def _get_user_permissions(data):
-        permissions = [Permission.objects.filter(group__id=id) for id in data.values()]
-        if permissions:
-            return [list(permission.values())[0] for permission in permissions]
-
-        return []
+    def _check_token(request, token):
+        if 'access' not in token:
+            try:
+                CachedTokenAuthentication().authenticate_credentials(
+                    token.get('auth_token'))
+            except APIException:
+                return False
+            return True
+
+        try:
+            claims = tokens.decode(token['access'])
+        except tokens.InvalidToken:
+            # Expired: trade the refresh token for new ones, which fails
+            # once the session has been logged out or revoked.
+            try:
+                data = tokens.refresh(token['refresh'])
+            except tokens.InvalidToken:
+                return False
+            request.session['token'] = {'access': data['access'],
+                                        'refresh': data['refresh']}
+            return True
+        return (not tokens.is_revoked(claims)
+                and get_user(claims['sub']) is not None)
 
 class UserLogoutView(View):
     def get(self, request):
         return redirect('/login')
 
     def post(self, request):
-        if check_session_if_exists(request):
-            del request.session['token']
-            del request.session['username']
-            del request.session['userid']
-
+        # Removes the session from its store (or the cookie) altogether.
+        request.session.flush()
         return redirect('/login')
 
 class UserSignUpView(View):
@@ -91,14 +110,13 @@ class UserSignUpView(View):
         return render(request, 'signup.html')
 
     def post(self, request):
-        url = 'http://localhost:8000/api/signup'
         payload = {"username":request.POST.get("username"),
             "email": request.POST.get("email"),
             "password": request.POST.get("password")}
-        response_data = requests.post(url, data=payload)
         message = {}
-        if response_data.status_code == status.HTTP_201_CREATED:
+        try:
+            auth_services.signup(request, payload)
             message['success_message'] = "Registration Successful! You may now login."
-        else:
-            message['error_message'] = construct_message(response_data)
+        except APIException as exc:
+            message['error_message'] = construct_message(exc)
         return render(request, 'signup.html', message)
@@ -0,0 +1,361 @@
+"""
+Bulk user provisioning from CSV or JSON Lines.
+
+Rows are processed in batches: one case-insensitive probe for the emails
+already taken, passwords hashed across a process pool (or taken as-is
+when already hashed), then the users and their role memberships written
+with COPY on PostgreSQL (batched bulk_create elsewhere) in one
+transaction per batch. Invalid rows are reported with their line number
+and skipped; they never fail the rest of the batch.
+
+Imported users do not go through signup: no djoser signals, audit events
+or per-row post_save receivers. Brand-new users have nothing cached, so
+the RBAC caches need no invalidation either.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.password_validation import validate_password
+from django.core import exceptions as django_exceptions
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from auth import hashing
+from utils import processes
+from .models import User
+from .services import UserGroups, get_roles_by_name
+
+FORMATS = ('csv', 'jsonl')
+USER_FIELDS = ('id', 'password', 'is_superuser', 'is_staff', 'is_active',
+               'date_joined', 'email', 'username')
+
+
+def guess_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    return 'jsonl' if extension in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+class _Lines(object):
+    """
+    Decodes a binary stream line by line as UTF-8. Lines that do not decode
+    are skipped and collected in `errors` as `(line number, message)`.
+    """
+
+    def __init__(self, stream):
+        self._lines = iter(stream)
+        self.count = 0
+        self.errors = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for line in self._lines:
+            self.count += 1
+            try:
+                return line.decode('utf-8')
+            except UnicodeDecodeError as e:
+                self.errors.append((self.count, f'Not UTF-8: {e.reason}.'))
+        raise StopIteration
+
+    def pop_errors(self):
+        errors, self.errors = self.errors, []
+        return errors
+
+
+def read_rows(stream, format):
+    """
+    Yields `(line number, row dict)` from a binary UTF-8 stream. Rows have
+    an `email`, a `username`, either a `password` or a `password_hash`,
+    and optionally `roles` (a list, or comma-separated role names). Lines
+    that cannot be read yield an error message instead of the dict.
+    """
+    lines = _Lines(stream)
+    if format == 'csv':
+        rows = csv.DictReader(lines)
+    elif format == 'jsonl':
+        rows = (_parse_json(line) for line in lines if line.strip())
+    else:
+        raise ValueError(f'Unknown import format {format}.')
+
+    for row in rows:
+        yield from lines.pop_errors()
+        yield lines.count, row
+    yield from lines.pop_errors()
+
+
+def _parse_json(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        row = None
+    return row if isinstance(row, dict) else 'Not a JSON object.'
+
+
+class ImportReport(object):
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.memberships = 0
+        self.errors = []
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created,
+                'memberships': self.memberships, 'failed': len(self.errors)}
+
+
+class _Row(object):
+    __slots__ = ('line', 'email', 'username', 'password', 'password_hash',
+                 'roles')
+
+
+def _check_types(data):
+    """
+    Returns why a JSON row's values have the wrong types, or None.
+    """
+    for name in ('email', 'username', 'password', 'password_hash'):
+        if not isinstance(data.get(name) or '', str):
+            return f"'{name}' must be a string."
+
+    roles = data.get('roles') or ''
+    if not (isinstance(roles, str) or (isinstance(roles, list) and all(
+            isinstance(name, str) for name in roles))):
+        return "'roles' must be a string or a list of strings."
+    return None
+
+
+def _split_roles(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return list(dict.fromkeys(name.strip() for name in value if name.strip()))
+
+
+class UserImporter(object):
+    """
+    Imports users batch by batch; `run()` yields the errors of each batch
+    once it is committed, while `report` keeps the running totals. Use it
+    as a context manager so the hashing pool is shut down.
+    """
+
+    def __init__(self, batch_size=1000, hash_workers=None,
+                 validate_passwords=True):
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self.validate_passwords = validate_passwords
+        self.report = ImportReport()
+        self._roles = {}
+        self._seen_emails = set()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def run(self, rows):
+        batch = []
+        for line, data in rows:
+            batch.append((line, data))
+            if len(batch) >= self.batch_size:
+                yield self._import_batch(batch)
+                batch = []
+        if batch:
+            yield self._import_batch(batch)
+
+    def _import_batch(self, batch):
+        self.report.rows += len(batch)
+        errors = []
+        rows = [row for row in (self._clean(line, data, errors)
+                                for line, data in batch) if row]
+        rows = self._drop_taken(rows, errors)
+        self._resolve_roles(rows)
+        self._hash_passwords(rows)
+
+        try:
+            created, memberships = self._write(rows)
+        except IntegrityError:
+            # An account was created concurrently; drop it and retry once.
+            rows = self._drop_taken(rows, errors)
+            try:
+                created, memberships = self._write(rows)
+            except IntegrityError as e:
+                errors.extend((row.line, row.email, f'Not imported: {e}')
+                              for row in rows)
+                created = memberships = 0
+
+        self.report.created += created
+        self.report.memberships += memberships
+        errors.sort()
+        self.report.errors.extend(errors)
+        return errors
+
+    def _clean(self, line, data, errors):
+        if isinstance(data, str):
+            errors.append((line, '', data))
+            return None
+
+        message = _check_types(data)
+        if message is not None:
+            email = data.get('email')
+            errors.append((line, email if isinstance(email, str) else '',
+                           message))
+            return None
+
+        row = _Row()
+        row.line = line
+        row.email = User.objects.normalize_email(
+            (data.get('email') or '').strip())
+        row.username = (data.get('username') or '').strip()
+        row.password = data.get('password') or None
+        row.password_hash = data.get('password_hash') or None
+        row.roles = _split_roles(data.get('roles'))
+
+        try:
+            self._validate(row)
+        except django_exceptions.ValidationError as e:
+            errors.append((line, row.email, ' '.join(e.messages)))
+            return None
+
+        self._seen_emails.add(row.email.lower())
+        return row
+
+    def _validate(self, row):
+        error = django_exceptions.ValidationError
+        validate_email(row.email)
+        if row.email.lower() in self._seen_emails:
+            raise error('Duplicate email in the import.')
+        if not row.username:
+            raise error('A username is required.')
+        if len(row.username) > User._meta.get_field('username').max_length:
+            raise error('The username is too long.')
+
+        if row.password_hash:
+            try:
+                hashers.identify_hasher(row.password_hash)
+            except ValueError:
+                raise error('Unknown password hash format.')
+        elif row.password:
+            if self.validate_passwords:
+                validate_password(row.password, SimpleNamespace(
+                    _meta=User._meta, email=row.email,
+                    username=row.username))
+        else:
+            raise error('A password or password_hash is required.')
+
+        # Roles are looked up once per import, unknown ones included.
+        missing = [name for name in row.roles if name not in self._roles]
+        if missing:
+            found = get_roles_by_name(missing)
+            self._roles.update((name, found.get(name)) for name in missing)
+        unknown = [name for name in row.roles if self._roles[name] is None]
+        if unknown:
+            raise error(f'No {", ".join(unknown)} role exists.')
+
+    @staticmethod
+    def _drop_taken(rows, errors):
+        if not rows:
+            return rows
+
+        # Compared like logins do, through users_user_email_lower_idx.
+        taken = set(User.objects
+                    .filter(email__lower__in=[row.email.lower()
+                                              for row in rows])
+                    .values_list('email__lower', flat=True))
+        if not taken:
+            return rows
+
+        errors.extend((row.line, row.email,
+                       'The email address already has an account.')
+                      for row in rows if row.email.lower() in taken)
+        return [row for row in rows if row.email.lower() not in taken]
+
+    def _resolve_roles(self, rows):
+        for row in rows:
+            row.roles = [self._roles[name] for name in row.roles]
+
+    def _hash_passwords(self, rows):
+        pending = [row for row in rows if not row.password_hash]
+        if not pending:
+            return
+
+        passwords = [row.password for row in pending]
+        if self.hash_workers > 1 and len(pending) > 1:
+            if self._executor is None:
+                hasher_settings = tuple((name, getattr(settings, name))
+                                        for name in hashing.HASHER_SETTINGS)
+                self._executor = ProcessPoolExecutor(
+                    self.hash_workers,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=processes.setup_django,
+                    initargs=(hasher_settings,))
+            chunksize = max(1, len(pending) // (self.hash_workers * 4))
+            encoded = self._executor.map(hashers.make_password, passwords,
+                                         chunksize=chunksize)
+        else:
+            encoded = map(hashers.make_password, passwords)
+
+        for row, password_hash in zip(pending, encoded):
+            row.password_hash = password_hash
+            row.password = None
+
+    def _write(self, rows):
+        if not rows:
+            return 0, 0
+
+        now = timezone.now()
+        users = [User(id=uuid.uuid4(), password=row.password_hash,
+                      email=row.email, username=row.username,
+                      is_active=True, is_staff=False, is_superuser=False,
+                      date_joined=now)
+                 for row in rows]
+        memberships = [UserGroups(user_id=user.id, group_id=group.pk)
+                       for user, row in zip(users, rows)
+                       for group in row.roles]
+
+        with transaction.atomic():
+            _insert(User, USER_FIELDS, users, self.batch_size)
+            _insert(UserGroups, ('user_id', 'group_id'), memberships,
+                    self.batch_size)
+
+        return len(users), len(memberships)
+
+
+def _insert(model, field_names, objs, batch_size):
+    if not objs:
+        return
+
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs, batch_size=batch_size)
+        return
+
+    # COPY skips the per-statement parsing and planning of INSERTs.
+    fields = [model._meta.get_field(name) for name in field_names]
+    buffer = io.StringIO()
+    # Every value is quoted, so none of them can read back as NULL.
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for obj in objs:
+        writer.writerow([
+            field.get_db_prep_save(getattr(obj, field.attname), connection)
+            for field in fields])
+    buffer.seek(0)
+
+    quote_name = connection.ops.quote_name
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote_name(model._meta.db_table)} ({columns}) '
+            f'FROM STDIN WITH (FORMAT csv)', buffer)
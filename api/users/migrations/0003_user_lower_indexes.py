@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building
+    # the indexes concurrently keeps users_user writable on large tables.
+    atomic = False
+
+    dependencies = [
+        ('users', '0002_auto_20210805_0200'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_email_lower_idx '
+            'ON users_user (lower(email));',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS users_user_email_lower_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_username_lower_idx '
+            'ON users_user (lower(username));',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS users_user_username_lower_idx;',
+        ),
+    ]
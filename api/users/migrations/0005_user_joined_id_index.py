@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built concurrently like the lower() indexes, see 0003.
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_auditevent'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS users_user_joined_id_idx '
+            'ON users_user (date_joined, id);',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS users_user_joined_id_idx;',
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='user',
+                    index=models.Index(fields=['date_joined', 'id'],
+                                       name='users_user_joined_id_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.2 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_refreshtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -1,19 +1,59 @@
 import uuid
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+models.CharField.register_lookup(Lower)
+
 
 class UserManager(BaseUserManager):
     use_in_migrations = True
+    case_insensitive_fields = ('email', 'username')
+
+    def filter_case_insensitive(self, field_name, value):
+        """
+        Filters on `lower(field) = lower(value)`, the expression covered by
+        the users_user_<field>_lower_idx indexes. Unlike `__iexact`, which
+        compiles to UPPER(...), this can never fall back to a sequential scan.
+        """
+        if field_name not in self.case_insensitive_fields:
+            raise ValueError(
+                f'No case-insensitive index exists for {field_name}.')
+
+        return self.filter(**{field_name + '__lower': Lower(Value(value))})
+
+    def get_case_insensitive(self, field_name, value):
+        users = self.filter_case_insensitive(field_name, value).order_by()[:1]
+        return next(iter(users), None)
+
+    def email_exists(self, email):
+        """
+        Whether an account uses `email`, compared case-insensitively like
+        logins do; a single probe of users_user_email_lower_idx.
+        """
+        return self.filter_case_insensitive('email', email).exists()
 
-    def _create_user(self, email, password, **extra_fields):
+    def _create_user(self, email, password, encoded_password=None,
+                     **extra_fields):
+        """
+        Creates the user, hashing `password` unless the hash is given as
+        `encoded_password` (e.g. computed by auth.hashing outside of the
+        transaction).
+        """
         if not email:
             raise ValueError('The email must be set')
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
-        user.save(using=self._db)
+        if encoded_password is not None:
+            user.password = encoded_password
+        else:
+            user.set_password(password)
+        # The primary key has a default, so a plain save() would try an
+        # UPDATE before the INSERT.
+        user.save(force_insert=True, using=self._db)
         return user
 
     def create_user(self, email, password=None, **extra_fields):
@@ -21,6 +61,15 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', False)
         return self._create_user(email, password, **extra_fields)
 
+    def create_active_user(self, email, encoded_password, **extra_fields):
+        """
+        Signup path: creates an active, unprivileged user from an already
+        hashed password with a single INSERT.
+        """
+        extra_fields.update(is_active=True, is_staff=False, is_superuser=False)
+        return self._create_user(email, None, encoded_password=encoded_password,
+                                 **extra_fields)
+
     def create_superuser(self, email, password, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -46,5 +95,69 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Keyset pagination of the user directory and export.
+            models.Index(fields=['date_joined', 'id'],
+                         name='users_user_joined_id_idx'),
+        ]
+
     def __str__(self):
         return self.email
+
+
+class AuditEvent(models.Model):
+    """
+    Append-only log of authentication events, written by users.tasks off
+    the request path. Events keep the user id even after the account is
+    deleted.
+    """
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    LOGOUT = 'logout'
+    SIGNUP = 'signup'
+    ACTION_CHOICES = (
+        (LOGIN, _('Login')),
+        (LOGIN_FAILED, _('Failed login')),
+        (LOGOUT, _('Logout')),
+        (SIGNUP, _('Signup')),
+    )
+
+    action = models.CharField(max_length=32, choices=ACTION_CHOICES)
+    user_id = models.UUIDField(null=True, blank=True, db_index=True)
+    username = models.CharField(max_length=255, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        # Written by the app only; no add/change/delete/view permissions.
+        default_permissions = ()
+
+    def __str__(self):
+        return f'{self.action} {self.username or self.user_id}'
+
+
+class RefreshToken(models.Model):
+    """
+    Refresh token of the signed token mode (see auth.tokens), stored as
+    the SHA-256 digest of its value. The tokens descending from one login
+    form a family: a refresh uses up its token and issues the next one.
+    Expired rows are deleted with `manage.py purge_refresh_tokens`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='refresh_tokens')
+    family = models.UUIDField(db_index=True)
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Managed by the token endpoints only.
+        default_permissions = ()
+
+    def __str__(self):
+        return f'{self.user_id} {self.family}'
@@ -0,0 +1,327 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+
+from utils.cache import TwoTierCache
+from utils.db.routers import use_primary
+from utils.http import make_etag
+from .models import User
+
+# A user's effective permissions are the union of their direct grants and
+# the grants of their groups. Both halves are cached separately so that a
+# change to a group only invalidates that group, not every member.
+UserGrants = namedtuple('UserGrants', ['permission_ids', 'group_ids'])
+# Every role as (name, id) and every permission as 'app_label.codename',
+# both sorted by name.
+Catalog = namedtuple('Catalog', ['version', 'etag', 'roles', 'permissions'])
+
+user_grants_cache = TwoTierCache(
+    'rbac:user',
+    timeout=settings.RBAC_CACHE_TIMEOUT,
+    local_maxsize=settings.RBAC_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+group_permissions_cache = TwoTierCache(
+    'rbac:group',
+    timeout=settings.RBAC_CACHE_TIMEOUT,
+    local_maxsize=settings.RBAC_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+permission_names_cache = TwoTierCache(
+    'rbac:permission_names',
+    timeout=settings.RBAC_CACHE_TIMEOUT,
+    local_maxsize=1,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+
+# Time (in ns) of the last change to each user's roles
+roles_stamp_cache = TwoTierCache(
+    'rbac:roles_stamp',
+    timeout=settings.RBAC_CACHE_TIMEOUT,
+    local_maxsize=settings.RBAC_LOCAL_CACHE_SIZE,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+# Holds the catalog version counter and one snapshot per version.
+catalog_cache = TwoTierCache(
+    'rbac:catalog',
+    timeout=settings.RBAC_CACHE_TIMEOUT,
+    local_maxsize=4,
+    local_timeout=settings.LOCAL_CACHE_TIMEOUT,
+)
+
+
+def _load_user_grants(user_ids):
+    user_ids = list(User.objects.filter(pk__in=user_ids)
+                    .values_list('pk', flat=True))
+    if not user_ids:
+        return {}
+
+    permission_ids = {user_id: set() for user_id in user_ids}
+    group_ids = {user_id: set() for user_id in user_ids}
+
+    rows = (User.user_permissions.through.objects
+            .filter(user_id__in=user_ids)
+            .values_list('user_id', 'permission_id'))
+    for user_id, permission_id in rows:
+        permission_ids[user_id].add(permission_id)
+
+    rows = (User.groups.through.objects
+            .filter(user_id__in=user_ids)
+            .values_list('user_id', 'group_id'))
+    for user_id, group_id in rows:
+        group_ids[user_id].add(group_id)
+
+    return {
+        str(user_id): UserGrants(frozenset(permission_ids[user_id]),
+                                 frozenset(group_ids[user_id]))
+        for user_id in user_ids
+    }
+
+
+def _load_group_permissions(group_ids):
+    permission_ids = {group_id: set() for group_id in group_ids}
+    rows = (Group.permissions.through.objects
+            .filter(group_id__in=group_ids)
+            .values_list('group_id', 'permission_id'))
+    for group_id, permission_id in rows:
+        permission_ids[group_id].add(permission_id)
+
+    return {str(group_id): frozenset(ids)
+            for group_id, ids in permission_ids.items()}
+
+
+def _get_many(two_tier_cache, keys, loader):
+    keys = {str(key) for key in keys}
+    found = two_tier_cache.get_many(keys)
+    missing = keys.difference(found)
+    if missing:
+        # Cache fills read the primary; a lagging replica could bring back
+        # an entry that was just invalidated.
+        with use_primary():
+            loaded = loader(missing)
+        two_tier_cache.set_many(loaded)
+        found.update(loaded)
+
+    return found
+
+
+def get_user_grants_many(user_ids):
+    """
+    Returns `{str(user_id): UserGrants}` for the users that exist.
+    """
+    return _get_many(user_grants_cache, user_ids, _load_user_grants)
+
+
+def get_group_permission_ids_many(group_ids):
+    group_ids = {int(group_id) for group_id in group_ids}
+    return _get_many(group_permissions_cache, group_ids,
+                     lambda missing: _load_group_permissions(
+                         [int(group_id) for group_id in missing]))
+
+
+def get_effective_permission_ids_many(user_ids):
+    """
+    Returns `{str(user_id): frozenset(permission ids)}` for the users that
+    exist. Warm lookups do not touch the database.
+    """
+    grants = get_user_grants_many(user_ids)
+    group_ids = set()
+    for user_grants in grants.values():
+        group_ids.update(user_grants.group_ids)
+    group_permissions = get_group_permission_ids_many(group_ids)
+
+    effective = {}
+    for user_id, user_grants in grants.items():
+        permission_ids = set(user_grants.permission_ids)
+        for group_id in user_grants.group_ids:
+            permission_ids.update(group_permissions.get(str(group_id), ()))
+        effective[user_id] = frozenset(permission_ids)
+
+    return effective
+
+
+def get_effective_permission_ids(user_id):
+    """
+    Returns the frozenset of permission ids granted to the user, directly
+    or through their groups, or None when the user does not exist.
+    """
+    return get_effective_permission_ids_many([user_id]).get(str(user_id))
+
+
+def get_permission_version(permission_ids):
+    """
+    A short digest of a set of permission ids; it changes whenever the set
+    does, so holders of a copy can tell it is outdated.
+    """
+    data = ','.join(str(pk) for pk in sorted(permission_ids)).encode()
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def get_permission_names():
+    """
+    Returns `{permission id: 'app_label.codename'}` for every permission.
+    """
+    def load():
+        with use_primary():
+            rows = list(Permission.objects.values_list(
+                'id', 'content_type__app_label', 'codename'))
+        return {pk: f'{app_label}.{codename}'
+                for pk, app_label, codename in rows}
+
+    return permission_names_cache.get_or_load('all', load)
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version, or None when the shared cache
+    is unavailable.
+    """
+    version = catalog_cache.get('version')
+    if version is None:
+        # Starting from the clock rather than 1 means a flushed cache can
+        # never bring back the version of an older snapshot.
+        catalog_cache.add('version', time.time_ns())
+        version = catalog_cache.get('version')
+
+    return version
+
+
+def _load_catalog(version):
+    with use_primary():
+        roles = tuple(Group.objects.order_by('name')
+                      .values_list('name', 'id'))
+        permissions = tuple(sorted(
+            f'{app_label}.{codename}' for app_label, codename in
+            Permission.objects.values_list('content_type__app_label',
+                                           'codename')))
+
+    return Catalog(version, make_etag(roles, permissions), roles, permissions)
+
+
+def get_catalog():
+    """
+    Returns the role and permission catalog. It is loaded once per
+    version and then served from process memory and the shared cache;
+    without the shared cache it is loaded on every call.
+    """
+    version = get_catalog_version()
+    if version is None:
+        return _load_catalog(None)
+
+    return catalog_cache.get_or_load(
+        f'v{version}', lambda: _load_catalog(version))
+
+
+def get_roles_validators(user_id):
+    """
+    Returns `(etag, last modified timestamp)` for the user's roles without
+    touching the database, or `(None, None)` when the shared cache is
+    unavailable. The ETag also covers role renames and deletions through
+    the catalog version; Last-Modified only tracks membership changes.
+    """
+    stamp = roles_stamp_cache.get(user_id)
+    if stamp is None:
+        # Unknown or evicted: from now on, which at worst costs the
+        # client one full response.
+        roles_stamp_cache.add(user_id, time.time_ns())
+        stamp = roles_stamp_cache.get(user_id)
+    catalog_version = get_catalog_version()
+    if stamp is None or catalog_version is None:
+        return None, None
+
+    return make_etag(str(user_id), stamp, catalog_version), stamp // 10 ** 9
+
+
+def check_permissions(user_ids, permission_ids=(), codenames=()):
+    """
+    Answers every (user, permission) pair with exact set membership.
+    Codenames may be qualified ('app_label.codename') or bare, in which
+    case any app's permission with that codename matches. Unknown users
+    map to None.
+    """
+    effective = get_effective_permission_ids_many(user_ids)
+
+    codename_ids = {}
+    if codenames:
+        by_name = {}
+        for pk, name in get_permission_names().items():
+            by_name.setdefault(name, set()).add(pk)
+            by_name.setdefault(name.split('.', 1)[1], set()).add(pk)
+        codename_ids = {codename: by_name.get(codename, set())
+                        for codename in codenames}
+
+    result = {}
+    for user_id in user_ids:
+        user_permission_ids = effective.get(str(user_id))
+        if user_permission_ids is None:
+            result[str(user_id)] = None
+            continue
+
+        checks = {str(pk): pk in user_permission_ids for pk in permission_ids}
+        checks.update({
+            codename: not user_permission_ids.isdisjoint(ids)
+            for codename, ids in codename_ids.items()
+        })
+        result[str(user_id)] = checks
+
+    return result
+
+
+def _invalidate(two_tier_cache, keys):
+    keys = [str(key) for key in keys]
+    if not keys:
+        return
+
+    # Delete again once the surrounding transaction commits, so a reader
+    # racing the write cannot re-cache the pre-commit state for long.
+    two_tier_cache.delete_many(keys)
+    transaction.on_commit(lambda: two_tier_cache.delete_many(keys))
+
+
+def invalidate_users(user_ids):
+    _invalidate(user_grants_cache, user_ids)
+
+
+def _bump_roles_stamps(keys):
+    now = time.time_ns()
+    stamps = roles_stamp_cache.get_many(keys)
+    # Last-Modified has one-second resolution: the new stamp must fall in
+    # a later second than the old one, or clients revalidating with
+    # If-Modified-Since alone would get a stale 304.
+    roles_stamp_cache.set_many({
+        key: max(now, (stamps[key] // 10 ** 9 + 1) * 10 ** 9)
+        if key in stamps else now
+        for key in keys
+    })
+
+
+def invalidate_roles_stamps(user_ids):
+    keys = [str(user_id) for user_id in user_ids]
+    if not keys:
+        return
+
+    # Bumped again on commit, like `_invalidate`.
+    _bump_roles_stamps(keys)
+    transaction.on_commit(lambda: _bump_roles_stamps(keys))
+
+
+def invalidate_groups(group_ids):
+    _invalidate(group_permissions_cache, group_ids)
+
+
+def invalidate_permission_names():
+    _invalidate(permission_names_cache, ['all'])
+
+
+def bump_catalog_version():
+    def bump():
+        catalog_cache.incr('version', time.time_ns())
+
+    # Bumped again on commit, like `_invalidate`, so a snapshot loaded
+    # before the commit is not served for long.
+    bump()
+    transaction.on_commit(bump)
@@ -1,11 +1,69 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from .models import User
+
+class UserDirectorySerializer(serializers.ModelSerializer):
+    # Reads the prefetched groups, no query per user.
+    roles = serializers.SlugRelatedField(
+        source = 'groups',
+        many = True,
+        read_only = True,
+        slug_field = 'name'
+    )
+
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'is_active', 'date_joined', 'roles')
+
 class CreateUserRolesSerializer(serializers.Serializer):
     roles = serializers.ListField(
         child = serializers.CharField()
     )
 
+class BulkUserRolesSerializer(CreateUserRolesSerializer):
+    user_ids = serializers.ListField(
+        child = serializers.UUIDField(),
+        allow_empty = False,
+        max_length = settings.USER_ROLES_BULK_MAX_USERS
+    )
+    action = serializers.ChoiceField(
+        choices = ('assign', 'revoke'),
+        default = 'assign'
+    )
+
+class UserImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices = ('csv', 'jsonl'),
+        required = False
+    )
+
 class CreateUserPermissionsSerializer(serializers.Serializer):
     permission_ids = serializers.ListField(
         child = serializers.IntegerField()
     )
+
+class CheckUserPermissionsSerializer(CreateUserPermissionsSerializer):
+    user_ids = serializers.ListField(
+        child = serializers.UUIDField(),
+        allow_empty = False,
+        max_length = settings.RBAC_BULK_CHECK_MAX_USERS
+    )
+    permission_ids = serializers.ListField(
+        child = serializers.IntegerField(),
+        required = False,
+        max_length = settings.RBAC_BULK_CHECK_MAX_PERMISSIONS
+    )
+    codenames = serializers.ListField(
+        child = serializers.CharField(),
+        required = False,
+        max_length = settings.RBAC_BULK_CHECK_MAX_PERMISSIONS
+    )
+
+    def validate(self, attrs):
+        if not attrs.get('permission_ids') and not attrs.get('codenames'):
+            raise serializers.ValidationError(
+                "Either 'permission_ids' or 'codenames' is required.")
+
+        return attrs
@@ -0,0 +1,200 @@
+import csv
+import io
+import json
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import m2m_changed
+from django.utils.translation import ugettext_lazy as _
+
+from config import exceptions
+from utils import pagination
+from .models import User
+from .serializers import UserDirectorySerializer
+
+ASSIGNED = 'assigned'
+REVOKED = 'revoked'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+
+UserGroups = User.groups.through
+
+# Backed by users_user_joined_id_idx
+DIRECTORY_ORDERING = ('date_joined', 'id')
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _send_m2m_changed(action, group, user_ids):
+    # Through-table bulk writes bypass the related manager, so announce
+    # them the way `group.user_set.add/remove` would to keep the caches
+    # fed by m2m_changed receivers consistent.
+    m2m_changed.send(sender=UserGroups, instance=group, action=action,
+                     reverse=True, model=User, pk_set=set(user_ids),
+                     using=UserGroups.objects.db)
+
+
+def _result(status, changed=0, unchanged=0):
+    return {'status': status, 'changed': changed, 'unchanged': unchanged}
+
+
+def get_user_roles(user_id):
+    """
+    Returns `{role name: role id}` for the user's roles.
+    """
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        raise exceptions.ObjectDoesNotExists(
+            _(f'No user with id={user_id} exists.'))
+
+    return {role.name: role.id for role in user.groups.all()}
+
+
+def get_directory_queryset():
+    """
+    Users with their roles in a single prefetch query per page or chunk.
+    """
+    return User.objects.prefetch_related(
+        Prefetch('groups', queryset=Group.objects.only('name')))
+
+
+def _render_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(UserDirectorySerializer.Meta.fields)
+    for row in rows:
+        row['roles'] = ','.join(row['roles'])
+        writer.writerow(row.values())
+    return buffer.getvalue()
+
+
+def export_users(export_type, chunk_size):
+    """
+    Yields the whole user directory as NDJSON or CSV text, one chunk of
+    `chunk_size` users (two queries) at a time, so memory use does not
+    grow with the number of users.
+    """
+    chunks = pagination.iterate_chunks(
+        get_directory_queryset(), DIRECTORY_ORDERING, chunk_size)
+    if export_type == 'csv':
+        yield _render_csv([], header=True)
+
+    for chunk in chunks:
+        rows = UserDirectorySerializer(chunk, many=True).data
+        if export_type == 'csv':
+            yield _render_csv(rows)
+        else:
+            yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def get_existing_user_ids(user_ids):
+    return set(User.objects.filter(pk__in=user_ids)
+               .values_list('pk', flat=True))
+
+
+def get_roles_by_name(role_names):
+    return {group.name: group
+            for group in Group.objects.filter(name__in=role_names)}
+
+
+def _get_memberships(user_ids, groups):
+    memberships = {group.pk: set() for group in groups}
+    rows = (UserGroups.objects
+            .filter(user_id__in=user_ids,
+                    group_id__in=[group.pk for group in groups])
+            .values_list('group_id', 'user_id'))
+    for group_id, user_id in rows:
+        memberships[group_id].add(user_id)
+
+    return memberships
+
+
+def _resolve_roles(role_names, require_all):
+    roles = get_roles_by_name(role_names)
+    missing = [name for name in role_names if name not in roles]
+    if missing and require_all:
+        raise Group.DoesNotExist(', '.join(missing))
+
+    return roles
+
+
+@transaction.atomic
+def assign_roles(user_ids, role_names, require_all=False):
+    """
+    Adds every user in `user_ids` to every role in `role_names` with one
+    lookup for the roles, one for the existing memberships and a single
+    bulk INSERT. Returns a per-role result map; unknown roles are
+    reported as not found, or raise `Group.DoesNotExist` before anything
+    is written when `require_all` is set.
+    """
+    user_ids = set(user_ids)
+    role_names = list(dict.fromkeys(role_names))
+    roles = _resolve_roles(role_names, require_all)
+    memberships = _get_memberships(user_ids, roles.values())
+
+    results = {}
+    rows = []
+    added = []
+    for name in role_names:
+        group = roles.get(name)
+        if group is None:
+            results[name] = _result(NOT_FOUND)
+            continue
+
+        missing = user_ids - memberships[group.pk]
+        rows.extend(UserGroups(user_id=user_id, group_id=group.pk)
+                    for user_id in missing)
+        if missing:
+            added.append((group, missing))
+        results[name] = _result(ASSIGNED if missing else UNCHANGED,
+                                len(missing), len(user_ids) - len(missing))
+
+    for group, missing in added:
+        _send_m2m_changed('pre_add', group, missing)
+    UserGroups.objects.bulk_create(rows)
+    for group, missing in added:
+        _send_m2m_changed('post_add', group, missing)
+
+    return results
+
+
+@transaction.atomic
+def revoke_roles(user_ids, role_names, require_all=False):
+    """
+    Removes every user in `user_ids` from every role in `role_names` with
+    a single DELETE. Returns a per-role result map like `assign_roles`.
+    """
+    user_ids = set(user_ids)
+    role_names = list(dict.fromkeys(role_names))
+    roles = _resolve_roles(role_names, require_all)
+    memberships = _get_memberships(user_ids, roles.values())
+
+    results = {}
+    removed = []
+    for name in role_names:
+        group = roles.get(name)
+        if group is None:
+            results[name] = _result(NOT_FOUND)
+            continue
+
+        present = memberships[group.pk]
+        if present:
+            removed.append((group, present))
+        results[name] = _result(REVOKED if present else UNCHANGED,
+                                len(present), len(user_ids) - len(present))
+
+    if removed:
+        for group, present in removed:
+            _send_m2m_changed('pre_remove', group, present)
+        UserGroups.objects.filter(
+            user_id__in=user_ids,
+            group_id__in=[group.pk for group, _ in removed]).delete()
+        for group, present in removed:
+            _send_m2m_changed('post_remove', group, present)
+
+    return results
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.signals import (user_logged_in, user_logged_out,
+                                         user_login_failed)
+from django.core.cache import cache
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from auth import authentication
+from utils.tasks import dispatch
+from . import rbac, tasks
+from .models import AuditEvent, User
+
+# Replaced by the coalesced, asynchronous update below.
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in, dispatch_uid='async_update_last_login')
+def schedule_last_login_update(sender, request, user, **kwargs):
+    now = timezone.now()
+    user.last_login = now
+
+    # One UPDATE per user and interval, however many logins happen. When
+    # the cache is down (None), update rather than skip.
+    if cache.add(f'users:last_login:{user.pk}', 1,
+                 settings.LAST_LOGIN_UPDATE_INTERVAL) is False:
+        return
+
+    dispatch(tasks.update_last_login, str(user.pk), now.isoformat())
+
+
+@receiver(user_logged_in, dispatch_uid='audit_login')
+def audit_login(sender, request, user, **kwargs):
+    tasks.audit(AuditEvent.LOGIN, request, user=user)
+
+
+@receiver(user_logged_out, dispatch_uid='audit_logout')
+def audit_logout(sender, request, user, **kwargs):
+    if user is not None:
+        tasks.audit(AuditEvent.LOGOUT, request, user=user)
+
+
+@receiver(user_login_failed, dispatch_uid='audit_login_failed')
+def audit_login_failed(sender, credentials, request=None, **kwargs):
+    tasks.audit(AuditEvent.LOGIN_FAILED, request,
+                username=credentials.get('username') or '')
+
+
+@receiver(post_delete, sender=Token, dispatch_uid='token_cache_delete')
+def invalidate_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User, dispatch_uid='token_cache_user_save')
+def invalidate_saved_user_tokens(sender, instance, created, update_fields,
+                                 **kwargs):
+    # last_login is written on every login and is not part of what the
+    # token cache needs to keep fresh.
+    if created or update_fields == frozenset(['last_login']):
+        return
+
+    authentication.invalidate_user_tokens(instance)
+
+
+@receiver(post_delete, sender=User, dispatch_uid='token_cache_user_delete')
+def invalidate_deleted_user(sender, instance, **kwargs):
+    authentication.invalidate_user(instance.pk)
+
+
+def _changed_related_ids(instance, action, pk_set, related_manager):
+    """
+    Returns the ids on the other side of an m2m change. Reverse clears
+    do not carry them, so they are captured on pre_clear.
+    """
+    if action == 'pre_clear':
+        instance._rbac_cleared_ids = list(
+            related_manager.values_list('pk', flat=True))
+        return []
+    if action == 'post_clear':
+        return instance.__dict__.pop('_rbac_cleared_ids', [])
+
+    return pk_set or []
+
+
+@receiver(m2m_changed, sender=User.groups.through,
+          dispatch_uid='rbac_user_groups_changed')
+@receiver(m2m_changed, sender=User.user_permissions.through,
+          dispatch_uid='rbac_user_permissions_changed')
+def invalidate_user_grants(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if action == 'pre_clear':
+            return
+        user_ids = [instance.pk]
+    else:
+        user_ids = _changed_related_ids(instance, action, pk_set,
+                                        instance.user_set)
+
+    rbac.invalidate_users(user_ids)
+    if sender is User.groups.through:
+        rbac.invalidate_roles_stamps(user_ids)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through,
+          dispatch_uid='rbac_group_permissions_changed')
+def invalidate_group_permissions(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if action != 'pre_clear':
+            rbac.invalidate_groups([instance.pk])
+        return
+
+    rbac.invalidate_groups(_changed_related_ids(
+        instance, action, pk_set, instance.group_set))
+
+
+@receiver(post_delete, sender=User, dispatch_uid='rbac_user_delete')
+def invalidate_deleted_user_grants(sender, instance, **kwargs):
+    rbac.invalidate_users([instance.pk])
+    rbac.invalidate_roles_stamps([instance.pk])
+
+
+@receiver(post_delete, sender=Group, dispatch_uid='rbac_group_delete')
+def invalidate_deleted_group_permissions(sender, instance, **kwargs):
+    rbac.invalidate_groups([instance.pk])
+
+
+@receiver(post_save, sender=Group, dispatch_uid='rbac_catalog_group_save')
+@receiver(post_delete, sender=Group, dispatch_uid='rbac_catalog_group_delete')
+@receiver(post_save, sender=Permission,
+          dispatch_uid='rbac_catalog_permission_save')
+@receiver(post_delete, sender=Permission,
+          dispatch_uid='rbac_catalog_permission_delete')
+def bump_catalog_version(sender, **kwargs):
+    rbac.bump_catalog_version()
+
+
+@receiver(post_save, sender=Permission, dispatch_uid='rbac_permission_save')
+def invalidate_saved_permission_names(sender, instance, **kwargs):
+    rbac.invalidate_permission_names()
+
+
+@receiver(pre_delete, sender=Permission, dispatch_uid='rbac_permission_pre_delete')
+def capture_deleted_permission_holders(sender, instance, **kwargs):
+    instance._rbac_group_ids = list(
+        instance.group_set.values_list('pk', flat=True))
+    instance._rbac_user_ids = list(
+        instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Permission, dispatch_uid='rbac_permission_delete')
+def invalidate_deleted_permission(sender, instance, **kwargs):
+    rbac.invalidate_groups(getattr(instance, '_rbac_group_ids', []))
+    rbac.invalidate_users(getattr(instance, '_rbac_user_ids', []))
+    rbac.invalidate_permission_names()
@@ -0,0 +1,63 @@
+from celery import shared_task
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from djoser import signals
+
+from utils.tasks import dispatch
+from .models import AuditEvent, User
+
+
+@shared_task
+def update_last_login(user_id, timestamp):
+    """
+    Sets the user's last_login unless a later login already did.
+    """
+    timestamp = parse_datetime(timestamp)
+    (User.objects
+     .filter(Q(last_login__isnull=True) | Q(last_login__lt=timestamp),
+             pk=user_id)
+     .update(last_login=timestamp))
+
+
+@shared_task
+def send_user_registered(user_id):
+    """
+    Runs the djoser `user_registered` receivers for a new account. They
+    get `request=None`, as the request is gone by then.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        signals.user_registered.send(sender=User, user=user, request=None)
+
+
+@shared_task
+def record_audit_event(action, created_at, user_id=None, username='',
+                       ip_address=None, user_agent=''):
+    AuditEvent.objects.create(
+        action=action,
+        created_at=parse_datetime(created_at),
+        user_id=user_id,
+        username=username,
+        ip_address=ip_address,
+        user_agent=user_agent,
+    )
+
+
+def audit(action, request=None, user=None, username=''):
+    """
+    Queues an AuditEvent for `user` (or the attempted `username`) with the
+    client address and user agent of `request`.
+    """
+    meta = request.META if request is not None else {}
+    dispatch(
+        record_audit_event,
+        action,
+        timezone.now().isoformat(),
+        user_id=str(user.pk) if user is not None else None,
+        username=((user.get_username() if user is not None else username)
+                  or '')[:255],
+        ip_address=meta.get('REMOTE_ADDR') or None,
+        user_agent=meta.get('HTTP_USER_AGENT', '')[:255],
+    )
@@ -0,0 +1,31 @@
+from django.db import connection
+from django.test import TestCase
+
+from users.models import User
+
+
+class UserManagerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('Test@Gmail.com', 'test1234test', username='Tester')
+
+    def test_get_case_insensitive(self):
+        self.assertEqual(User.objects.get_case_insensitive('email', 'TEST@gmail.COM'), self.user)
+        self.assertEqual(User.objects.get_case_insensitive('username', 'tester'), self.user)
+        self.assertIsNone(User.objects.get_case_insensitive('username', 'nobody'))
+
+
+    def test_get_case_insensitive_unindexed_field(self):
+        with self.assertRaises(ValueError):
+            User.objects.get_case_insensitive('password', 'test1234test')
+
+
+    def test_case_insensitive_lookup_uses_lower_index(self):
+        # The test table is tiny, so forbid sequential scans to see which
+        # index the planner is able to use.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        for field_name, value in (('email', 'test@gmail.com'), ('username', 'TESTER')):
+            plan = User.objects.filter_case_insensitive(field_name, value).explain()
+            self.assertIn('Index Scan', plan)
+            self.assertIn(f'users_user_{field_name}_lower_idx', plan)
@@ -1,8 +1,14 @@
 from django.urls import path
-from .views import UserPermissionsView, UserRolesView
+from .views import (BulkUserRolesView, CheckUserPermissionsView, UserDirectoryView,
+                    UserExportView, UserImportView, UserPermissionsView, UserRolesView)
 
 
 urlpatterns = [
+    path('', UserDirectoryView.as_view(), name='users_directory'),
+    path('export', UserExportView.as_view(), name='users_export'),
+    path('permissions/check', CheckUserPermissionsView.as_view(), name='users_permissions_check'),
+    path('roles', BulkUserRolesView.as_view(), name='users_roles_bulk'),
+    path('import', UserImportView.as_view(), name='users_import'),
     path('<uuid:id>/permissions', UserPermissionsView.as_view(), name='user_specific_permissions'),
     path('<uuid:id>/roles', UserRolesView.as_view(), name='user_specific_roles'),
 ]
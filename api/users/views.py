@@ -1,21 +1,59 @@
-from django.contrib.auth import get_user_model
-from django.contrib.auth.models import Permission, Group
+import json
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
-from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 
-from rest_framework import generics, permissions, status
+from rest_framework import generics, parsers, permissions, status
 from rest_framework.response import Response
 
 from config import exceptions
-from . import serializers
+from utils.http import make_etag, not_modified, set_validators
+from utils.pagination import KeysetPagination
+from utils.transactions import TransactionPolicyMixin
+from . import importing, rbac, serializers, services
+
+class UserDirectoryPagination(KeysetPagination):
+    ordering = services.DIRECTORY_ORDERING
+
+class UserDirectoryView(TransactionPolicyMixin, generics.ListAPIView):
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = serializers.UserDirectorySerializer
+    pagination_class = UserDirectoryPagination
+    filter_backends = ()
 
-User = get_user_model()
+    def get_queryset(self):
+        return services.get_directory_queryset()
 
-class UserPermissionsView(generics.CreateAPIView):
+class UserExportView(TransactionPolicyMixin, generics.GenericAPIView):
+    """
+    Streams all users as NDJSON (`?type=ndjson`, the default) or CSV.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = serializers.UserDirectorySerializer
+
+    def get(self, request):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in services.EXPORT_CONTENT_TYPES:
+            content = {"message": f"'type' must be one of "
+                                  f"{', '.join(services.EXPORT_CONTENT_TYPES)}."}
+            return Response(data=content, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            services.export_users(export_type,
+                                  settings.USER_EXPORT_CHUNK_SIZE),
+            content_type=services.EXPORT_CONTENT_TYPES[export_type])
+        response['Content-Disposition'] = \
+            f'attachment; filename="users.{export_type}"'
+        return response
+
+class UserPermissionsView(TransactionPolicyMixin, generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.CreateUserPermissionsSerializer
+    # POST only reads
+    atomic_methods = ()
 
     def post(self, request, id):
         permission_ids = request.POST.get('permission_ids')
@@ -23,32 +61,54 @@ class UserPermissionsView(generics.CreateAPIView):
             content = {"message": f"'permission_ids' field is required."}
             return Response(data=content, status=status.HTTP_400_BAD_REQUEST)
 
-        user = User.objects.get(id=id)
-        permissions = Permission.objects.filter(Q(user=user) | Q(group__user=user)).all()
-        result = { p_id : False for p_id in permission_ids.split(',') }
+        user_permission_ids = rbac.get_effective_permission_ids(id)
+        if user_permission_ids is None:
+            raise exceptions.ObjectDoesNotExists(
+                _(f'No user with id={id} exists.'))
+
+        result = {
+            # isdigit() also accepts characters like '²' that int() rejects.
+            p_id: p_id.isdecimal() and int(p_id) in user_permission_ids
+            for p_id in permission_ids.split(',')
+        }
+
+        return Response(data=result)
+
+class CheckUserPermissionsView(TransactionPolicyMixin, generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = serializers.CheckUserPermissionsSerializer
+    # POST only reads
+    atomic_methods = ()
 
-        for permission in permissions:
-            if str(permission.id) in permission_ids:
-                result.update(
-                    {
-                        str(permission.id): True
-                    }
-                )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = rbac.check_permissions(
+            serializer.validated_data['user_ids'],
+            permission_ids=serializer.validated_data.get('permission_ids', ()),
+            codenames=serializer.validated_data.get('codenames', ()))
 
         return Response(data=result)
 
-class UserRolesView(generics.CreateAPIView):
+class UserRolesView(TransactionPolicyMixin, generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.CreateUserRolesSerializer
 
     def get(self, request, id):
-        try:
-            user = User.objects.get(id=id)
-        except ObjectDoesNotExist:
-            raise exceptions.ObjectDoesNotExists(
-                _(f'No user with id={id} exists.'))
+        # Pollers revalidate without a database query while the roles
+        # are unchanged.
+        etag, last_modified = rbac.get_roles_validators(id)
+        if etag is not None:
+            response = not_modified(request, etag=etag,
+                                    last_modified=last_modified)
+            if response is not None:
+                return response
 
-        return Response({role.name: role.id for role in user.groups.all()})
+        roles = services.get_user_roles(id)
+        if etag is None:
+            etag = make_etag(str(id), roles)
+        return set_validators(Response(roles), etag, last_modified)
 
     def post(self, request, id):
         roles = request.POST.get('roles')
@@ -56,18 +116,85 @@ class UserRolesView(generics.CreateAPIView):
             content = {"message": f"'roles' field is required."}
             return Response(data=content, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user = User.objects.get(id=id)
-            for role in roles.split(','):
-                roles_obj = Group.objects.get(name=role)
-                roles_obj.user_set.add(user)
+        role_names = list(dict.fromkeys(roles.split(',')))
+        if not services.get_existing_user_ids([id]):
+            raise exceptions.ObjectDoesNotExists(
+                _(f'No user with id={id} exists.'))
 
+        try:
+            results = services.assign_roles([id], role_names, require_all=True)
         except IntegrityError:
             raise exceptions.AlreadyExists(
-                _(f'{role} already assigned to user.'))
-        except ObjectDoesNotExist:
+                _(f'{roles} already assigned to user.'))
+        except ObjectDoesNotExist as e:
             raise exceptions.ObjectDoesNotExists(
-                _(f'No user with id={id} and/or no {role} role exists.'))
+                _(f'No {e} role exists.'))
 
-        content = {"message": f"{role} has been added to user."}
+        content = {"message": f"{', '.join(role_names)} has been added to user.",
+                   "roles": results}
         return Response(data=content, status=status.HTTP_201_CREATED)
+
+class BulkUserRolesView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = serializers.BulkUserRolesSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user_ids = set(serializer.validated_data['user_ids'])
+        existing_user_ids = services.get_existing_user_ids(user_ids)
+        if serializer.validated_data['action'] == 'revoke':
+            change_roles = services.revoke_roles
+        else:
+            change_roles = services.assign_roles
+
+        try:
+            results = change_roles(existing_user_ids,
+                                   serializer.validated_data['roles'])
+        except IntegrityError:
+            raise exceptions.AlreadyExists(
+                _('Roles were concurrently assigned, please retry.'))
+
+        content = {
+            "roles": results,
+            "unknown_user_ids": sorted(str(user_id) for user_id in
+                                       user_ids - existing_user_ids),
+        }
+        return Response(data=content)
+
+class UserImportView(TransactionPolicyMixin, generics.GenericAPIView):
+    """
+    Streams the import of an uploaded CSV or JSON Lines file back as JSON
+    lines: one per failed row, one progress line per committed batch and
+    a final result line.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [parsers.MultiPartParser]
+    serializer_class = serializers.UserImportSerializer
+    # Batches commit one by one as the response streams.
+    atomic_methods = ()
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = serializer.validated_data['file']
+        format = (serializer.validated_data.get('format')
+                  or importing.guess_format(upload.name))
+        importer = importing.UserImporter(
+            batch_size=settings.USER_IMPORT_BATCH_SIZE,
+            hash_workers=settings.USER_IMPORT_HASH_WORKERS)
+
+        def events():
+            with importer:
+                rows = importing.read_rows(upload, format)
+                for errors in importer.run(rows):
+                    for line, email, message in errors:
+                        yield {'line': line, 'email': email, 'error': message}
+                    yield {'progress': importer.report.as_dict()}
+            yield {'result': importer.report.as_dict()}
+
+        return StreamingHttpResponse(
+            (json.dumps(event) + '\n' for event in events()),
+            content_type='application/x-ndjson')
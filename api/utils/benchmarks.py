@@ -0,0 +1,45 @@
+"""
+Helpers for the bench_* management commands, which simulate one worker
+process serving concurrent requests on its threads.
+"""
+import os
+import threading
+import time
+
+from django.db import connection
+
+
+def add_concurrency_arguments(parser):
+    parser.add_argument(
+        '--threads', type=int,
+        default=int(os.environ.get('GUNICORN_THREADS', 4)),
+        help='Concurrent request threads of the simulated worker.')
+    parser.add_argument('--duration', type=float, default=3)
+
+
+def run_concurrently(func, threads, duration):
+    """
+    Calls `func` in a loop on `threads` threads for `duration` seconds and
+    returns the calls per second. Each thread closes its own database
+    connection when done.
+    """
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def run(index):
+        try:
+            while time.perf_counter() < deadline:
+                func()
+                counts[index] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=run, args=(index,))
+               for index in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return sum(counts) / (time.perf_counter() - started)
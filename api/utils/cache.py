@@ -0,0 +1,212 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from . import metrics
+
+_MISSING = object()
+_registry = weakref.WeakSet()
+
+
+class LocalLRUCache(object):
+    """
+    Thread-safe, size-bounded LRU cache with per-entry expiry. Entries live
+    in the memory of the current worker process only.
+    """
+
+    def __init__(self, maxsize=1024, timeout=5):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.add(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        if self.maxsize <= 0:
+            return
+
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache(object):
+    """
+    Reads go to the process-local LRU first and then to the shared
+    (django_redis) cache; values found in the shared cache are promoted
+    to the local tier.
+
+    The local tier is not invalidated across processes, so its timeout
+    bounds how long another worker may serve a stale entry after an
+    invalidation. Keep it short.
+    """
+
+    def __init__(self, namespace, timeout, local_maxsize=1024,
+                 local_timeout=5, cache_alias='default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+        self.local = LocalLRUCache(maxsize=local_maxsize,
+                                   timeout=min(local_timeout, timeout))
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, key):
+        return '{0}:{1}'.format(self.namespace, key)
+
+    def _count(self, event, value=1):
+        metrics.incr('{0}.{1}'.format(self.namespace, event), value)
+
+    def get(self, key, default=None):
+        cache_key = self.make_key(key)
+        value = self.local.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+
+        # django_redis returns None rather than the default when
+        # IGNORE_EXCEPTIONS swallows an error, so None always means a miss.
+        value = self.shared.get(cache_key)
+        if value is not None:
+            self._count('shared_hits')
+            self.local.set(cache_key, value)
+            return value
+
+        self._count('misses')
+        return default
+
+    def get_many(self, keys):
+        """
+        Returns a dict with the entries found for `keys`; missing keys are
+        left out of the result.
+        """
+        found = {}
+        pending = {}
+        for key in keys:
+            cache_key = self.make_key(key)
+            value = self.local.get(cache_key, _MISSING)
+            if value is _MISSING:
+                pending[cache_key] = key
+            else:
+                found[key] = value
+        self._count('local_hits', len(found))
+
+        if pending:
+            shared = self.shared.get_many(list(pending)) or {}
+            for cache_key, value in shared.items():
+                found[pending[cache_key]] = value
+                self.local.set(cache_key, value)
+            self._count('shared_hits', len(shared))
+            self._count('misses', len(pending) - len(shared))
+
+        return found
+
+    def set(self, key, value, timeout=None):
+        cache_key = self.make_key(key)
+        self.local.set(cache_key, value)
+        self.shared.set(cache_key, value,
+                        self.timeout if timeout is None else timeout)
+
+    def set_many(self, mapping, timeout=None):
+        if not mapping:
+            return
+
+        data = {self.make_key(key): value for key, value in mapping.items()}
+        for cache_key, value in data.items():
+            self.local.set(cache_key, value)
+        self.shared.set_many(data,
+                             self.timeout if timeout is None else timeout)
+
+    def add(self, key, value, timeout=None):
+        """
+        Sets `key` in the shared cache only if it is not set there yet.
+        """
+        return self.shared.add(self.make_key(key), value,
+                               self.timeout if timeout is None else timeout)
+
+    def incr(self, key, default):
+        """
+        Increments the shared integer `key`, creating it as `default` when
+        it is missing. Drops the local copy, so this process sees the new
+        value at once and the others within the local timeout.
+        """
+        cache_key = self.make_key(key)
+        self.local.delete(cache_key)
+        try:
+            return self.shared.incr(cache_key)
+        except ValueError:
+            self.add(key, default)
+            return self.shared.get(cache_key)
+
+    def delete(self, key):
+        cache_key = self.make_key(key)
+        self.local.delete(cache_key)
+        self.shared.delete(cache_key)
+
+    def delete_many(self, keys):
+        cache_keys = [self.make_key(key) for key in keys]
+        if not cache_keys:
+            return
+
+        self.local.delete_many(cache_keys)
+        self.shared.delete_many(cache_keys)
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for `key`, calling `loader()` and caching
+        its result on a miss. `None` results are never cached.
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+
+        return value
+
+
+def clear_local_caches():
+    """
+    Drops every process-local cache, including the local tier of the
+    two-tier caches.
+    """
+    for local_cache in list(_registry):
+        local_cache.clear()
@@ -0,0 +1,100 @@
+"""
+PostgreSQL backend that checks connections out of a per-process pool
+instead of opening one per request.
+
+    DATABASES['default']['ENGINE'] = 'utils.db.backends.postgresql_pool'
+    DATABASES['default']['POOL'] = {
+        'SIZE': 10,                   # per worker process
+        'TIMEOUT': 10,                # seconds to wait for a free connection
+        'HEALTH_CHECK_INTERVAL': 30,  # idle seconds before a SELECT 1 on reuse
+        'MAX_LIFETIME': 1800,         # seconds; None keeps connections forever
+    }
+
+Keep `CONN_MAX_AGE` at 0: Django then "closes" the connection at the end
+of every request, which returns it to the pool for the next thread
+instead of pinning one connection per thread.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation
+
+from ... import pool
+
+Database = base.Database
+
+POOL_DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 10,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'MAX_LIFETIME': 1800,
+}
+
+
+def _pool_key(alias, conn_params):
+    return (alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+
+
+class PooledDatabaseCreation(DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled sessions would block DROP DATABASE.
+        pool.close_pools(lambda key: key[0] == self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = PooledDatabaseCreation
+
+    def get_pool_options(self):
+        options = dict(POOL_DEFAULTS)
+        options.update(self.settings_dict.get('POOL') or {})
+        return options
+
+    def get_new_connection(self, conn_params):
+        options = self.get_pool_options()
+        connection_pool = pool.get_pool(
+            _pool_key(self.alias, conn_params),
+            lambda: pool.ConnectionPool(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params),
+                size=options['SIZE'],
+                timeout=options['TIMEOUT'],
+                health_check_interval=options['HEALTH_CHECK_INTERVAL'],
+                max_lifetime=options['MAX_LIFETIME'],
+                metrics_prefix=f'db.pool.{self.alias}',
+            ))
+
+        try:
+            connection = connection_pool.checkout()
+        except pool.PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+        # The parent sets this when it opens a connection; reused ones
+        # keep the isolation level they were opened with.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        self._pool = connection_pool
+        return connection
+
+    def _close(self):
+        connection_pool = getattr(self, '_pool', None)
+        if connection_pool is None:
+            return super()._close()
+
+        connection = self.connection
+        self._pool = None
+        if self.in_atomic_block:
+            # Django keeps using the closed connection object until the
+            # atomic block exits; never hand it to another thread.
+            connection_pool.discard(connection)
+            return
+
+        try:
+            status = connection.get_transaction_status()
+            if status != Database.extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            # Broken connection: drop it, the next checkout opens a new one.
+            connection_pool.discard(connection)
+            return
+
+        connection_pool.checkin(connection)
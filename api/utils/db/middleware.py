@@ -0,0 +1,50 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import routers
+
+PIN_COOKIE_NAME = 'db_pin'
+
+
+def _client_cache_key(request):
+    # Token clients usually do not keep cookies; pin their credentials.
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f'db:pin:{digest}'
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Read-your-writes for replica routing: once a request has written to
+    the auth tables, the same client reads from the primary for the next
+    DATABASE_REPLICA_PIN_SECONDS, through a cookie and, for requests with
+    an Authorization header, a cache entry keyed by its digest.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+
+    def __call__(self, request):
+        routers.reset()
+        cache_key = _client_cache_key(request)
+        if request.COOKIES.get(PIN_COOKIE_NAME) or (
+                cache_key and cache.get(cache_key)):
+            routers.pin_to_primary()
+
+        try:
+            response = self.get_response(request)
+            if routers.has_written():
+                response.set_cookie(PIN_COOKIE_NAME, '1',
+                                    max_age=self.pin_seconds, httponly=True)
+                if cache_key:
+                    cache.set(cache_key, True, self.pin_seconds)
+        finally:
+            routers.reset()
+
+        return response
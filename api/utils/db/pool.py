@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+from collections import deque
+
+from .. import metrics
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools inherited through fork() are never touched again, but their
+# sockets are shared with the parent: closing them (even implicitly, by
+# garbage collection) would terminate the parent's sessions.
+_inherited = []
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Bounded, thread-safe pool of DB-API connections for one process.
+
+    At most `size` connections are open at a time; `checkout` blocks for
+    up to `timeout` seconds when all of them are in use. Idle connections
+    are handed out most-recently-used first and are health-checked before
+    reuse once they have been idle for `health_check_interval` seconds.
+    """
+
+    def __init__(self, connect, size=10, timeout=10,
+                 health_check_interval=30, max_lifetime=None,
+                 metrics_prefix='db.pool'):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.metrics_prefix = metrics_prefix
+        self.pid = os.getpid()
+        # (connection, opened_at, idle_since)
+        self._idle = deque()
+        self._opened_at = {}
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _incr(self, name, value=1):
+        metrics.incr(f'{self.metrics_prefix}.{name}', value)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._open - len(self._idle),
+            }
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if not self._idle and self._open >= self.size:
+                self._incr('waits')
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._incr('timeouts')
+                    raise PoolTimeout(
+                        'No database connection became available within '
+                        '%ss (pool size %s).' % (self.timeout, self.size))
+                self._cond.wait(remaining)
+
+            if self._idle:
+                connection, idle_since = self._idle.pop()
+            else:
+                connection, idle_since = None, None
+                # Reserve the slot before connecting outside the lock.
+                self._open += 1
+
+        if connection is not None:
+            connection = self._revalidate(connection, idle_since)
+        if connection is None:
+            connection = self._open_connection()
+
+        self._incr('checkouts')
+        self._incr('checked_out')
+        return connection
+
+    def checkin(self, connection):
+        """
+        Returns a connection that is idle (no open transaction) to the
+        pool, or closes it when it is broken, expired or the pool belongs
+        to another process.
+        """
+        self._incr('checked_out', -1)
+        reusable = (
+            self.pid == os.getpid()
+            and not connection.closed
+            and not self._expired(connection)
+        )
+        if not reusable:
+            self.discard(connection, checked_out=False)
+            return
+
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, connection, checked_out=True):
+        """
+        Closes a connection and frees its slot.
+        """
+        if checked_out:
+            self._incr('checked_out', -1)
+        self._close(connection)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def close(self):
+        """
+        Closes the idle connections. Checked out ones are closed when they
+        are returned.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _open_connection(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        self._opened_at[id(connection)] = time.monotonic()
+        self._incr('connections_opened')
+        return connection
+
+    def _close(self, connection):
+        self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._incr('connections_closed')
+
+    def _expired(self, connection):
+        if self.max_lifetime is None:
+            return False
+        opened_at = self._opened_at.get(id(connection), 0)
+        return time.monotonic() - opened_at >= self.max_lifetime
+
+    def _revalidate(self, connection, idle_since):
+        # Returns the connection when it is still usable, otherwise closes
+        # it and returns None, keeping its slot reserved for a new one.
+        healthy = not connection.closed and not self._expired(connection)
+        if healthy and time.monotonic() - idle_since >= self.health_check_interval:
+            healthy = self._ping(connection)
+            if not healthy:
+                self._incr('health_check_failures')
+
+        if healthy:
+            return connection
+
+        self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._incr('connections_closed')
+        return None
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+
+def get_pool(key, factory):
+    """
+    Returns this process' pool for `key`, creating it with `factory()`
+    the first time, and again in a child after a fork.
+    """
+    pid = os.getpid()
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == pid:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != pid:
+            if pool is not None:
+                _inherited.append(pool)
+            pool = _pools[key] = factory()
+
+    return pool
+
+
+def close_pools(match=None):
+    """
+    Closes the idle connections of this process' pools, or of the pools
+    whose key satisfies `match(key)`.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items()
+                 if pool.pid == pid and (match is None or match(key))]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    pid = os.getpid()
+    with _pools_lock:
+        pools = list(_pools.items())
+
+    return {key[0]: pool.stats() for key, pool in pools if pool.pid == pid}
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .. import metrics
+
+# Seconds the replica is behind the primary; NULL on a primary.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_state = threading.local()
+
+
+def _get_state():
+    if not hasattr(_state, 'pinned'):
+        reset()
+    return _state
+
+
+def reset():
+    """
+    Forgets the pin and writes of the current thread, e.g. between two
+    requests served by the same thread.
+    """
+    _state.pinned = False
+    _state.written = False
+    _state.primary_depth = 0
+
+
+def pin_to_primary():
+    """
+    Sends the remaining reads of the current thread to the primary.
+    """
+    _get_state().pinned = True
+
+
+def has_written():
+    return _get_state().written
+
+
+@contextmanager
+def use_primary():
+    """
+    Reads in the block go to the primary. Use it around cache fills: a
+    lagging replica could repopulate an entry invalidated a moment ago.
+    """
+    state = _get_state()
+    state.primary_depth += 1
+    try:
+        yield
+    finally:
+        state.primary_depth -= 1
+
+
+class ReplicaRouter(object):
+    """
+    Sends reads of the auth related apps to a replica that is at most
+    DATABASE_REPLICA_MAX_LAG seconds behind, falling back to the primary
+    when none is. Everything else, writes, reads inside a transaction and
+    reads after a write by the same thread (or a pinned client, see
+    ReplicaPinningMiddleware) use the primary.
+    """
+    routed_app_labels = ('users', 'auth', 'authtoken', 'contenttypes')
+
+    def __init__(self):
+        self.replicas = list(settings.DATABASE_REPLICAS)
+        self.max_lag = settings.DATABASE_REPLICA_MAX_LAG
+        self.check_interval = settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL
+        # alias -> (checked at, lag in seconds or None when unreachable)
+        self._lag = {}
+        self._lock = threading.Lock()
+
+    def _is_routed(self, model):
+        return model._meta.app_label in self.routed_app_labels
+
+    def measure_lag(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            metrics.incr('db.replica.unavailable')
+            return None
+
+        return float(lag or 0)
+
+    def get_lag(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lag.get(alias)
+            if entry is not None and now - entry[0] < self.check_interval:
+                return entry[1]
+            # Other threads keep using the previous value meanwhile.
+            self._lag[alias] = (now, entry[1] if entry else 0.0)
+
+        lag = self.measure_lag(alias)
+        with self._lock:
+            self._lag[alias] = (now, lag)
+        return lag
+
+    def get_replica(self):
+        candidates = []
+        for alias in self.replicas:
+            lag = self.get_lag(alias)
+            if lag is not None and lag <= self.max_lag:
+                candidates.append(alias)
+
+        if not candidates:
+            return None
+
+        return random.choice(candidates)
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not self._is_routed(model):
+            return None
+
+        state = _get_state()
+        if (state.pinned or state.primary_depth
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+
+        alias = self.get_replica()
+        if alias is None:
+            metrics.incr('db.replica.fallbacks')
+            return DEFAULT_DB_ALIAS
+
+        metrics.incr('db.replica.reads')
+        return alias
+
+    def db_for_write(self, model, **hints):
+        if not self._is_routed(model):
+            return None
+
+        state = _get_state()
+        state.written = True
+        state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """
+    A strong ETag for the JSON-serializable `parts`.
+    """
+    data = json.dumps(parts, sort_keys=True, default=str).encode()
+    return quote_etag(hashlib.sha1(data).hexdigest())
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """
+    Sets the ETag and Last-Modified (a timestamp) headers, and makes
+    clients and shared caches revalidate before every reuse.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    Returns the 304 (or 412) response the request's conditional headers
+    call for, or None when the full response has to be sent.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,99 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import authenticate, hashers
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from users.models import User
+from utils import benchmarks
+
+PASSWORD = 'bench-password-1234'
+
+
+def parse_argon2_params(value):
+    names = {'t': 'PASSWORD_ARGON2_TIME_COST',
+             'm': 'PASSWORD_ARGON2_MEMORY_COST',
+             'p': 'PASSWORD_ARGON2_PARALLELISM'}
+    params = dict(bit.split('=', 1) for bit in value.split(','))
+    return {names[name]: int(cost) for name, cost in params.items()}
+
+
+class Command(BaseCommand):
+    help = ('Measures password hashes/sec on one core and logins/sec of one '
+            'worker process for each hasher strategy, argon2 parameter set '
+            'and hashing pool mode.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategies', default='argon2id,pbkdf2')
+        parser.add_argument(
+            '--argon2', action='append', default=[],
+            help='Argon2 costs like t=2,m=19456,p=1; repeat to compare.')
+        parser.add_argument('--pools', default='none,thread,process')
+        parser.add_argument('--pool-size', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        benchmarks.add_concurrency_arguments(parser)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        email = f'bench-{suffix}@example.com'
+        # Login threads use their own connections, so the account has to
+        # be committed; it is deleted at the end.
+        user = User.objects.create_user(email, PASSWORD,
+                                        username=f'bench-{suffix}')
+        try:
+            self._run(email, options)
+        finally:
+            user.delete()
+
+    def _variants(self, options):
+        for strategy in options['strategies'].split(','):
+            hasher = settings.PASSWORD_HASHER_STRATEGIES[strategy]
+            base = {'PASSWORD_HASHERS': [hasher] + [
+                name for name in settings.PASSWORD_HASHERS if name != hasher]}
+            if strategy != 'argon2id':
+                yield strategy, base
+                continue
+
+            for params in options['argon2'] or ['']:
+                overrides = dict(base, **parse_argon2_params(params)) \
+                    if params else base
+                yield f'{strategy} {params}'.strip(), overrides
+
+    def _run(self, email, options):
+        self.stdout.write(f'{"hasher":<30}{"pool":<9}'
+                          f'{"hashes/s/core":>15}{"logins/s/worker":>17}')
+        for label, overrides in self._variants(options):
+            with override_settings(**overrides):
+                hashes_per_second = self._hashes_per_second(
+                    options['iterations'])
+                for pool in options['pools'].split(','):
+                    with override_settings(
+                            PASSWORD_HASHING_POOL=pool,
+                            PASSWORD_HASHING_POOL_SIZE=options['pool_size']):
+                        logins_per_second = self._logins_per_second(
+                            email, options['threads'], options['duration'])
+                    self.stdout.write(
+                        f'{label:<30}{pool:<9}{hashes_per_second:>15.1f}'
+                        f'{logins_per_second:>17.1f}')
+
+    @staticmethod
+    def _hashes_per_second(iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            hashers.make_password(PASSWORD)
+        return iterations / (time.perf_counter() - started)
+
+    @staticmethod
+    def _logins_per_second(email, threads, duration):
+        # The first login upgrades the stored hash to the current hasher.
+        authenticate(username=email, password=PASSWORD)
+        connection.close()
+
+        def login():
+            user = authenticate(username=email, password=PASSWORD)
+            assert user is not None, 'Login failed.'
+
+        return benchmarks.run_concurrently(login, threads, duration)
@@ -0,0 +1,88 @@
+import secrets
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from auth import tokens
+from auth.views import IntrospectionView
+from users.models import User
+from utils import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Measures queries per request and introspections/sec of one '
+            'worker process for single and batched token introspection.')
+
+    def add_arguments(self, parser):
+        benchmarks.add_concurrency_arguments(parser)
+        parser.add_argument(
+            '--batch-sizes', default='1,10,100',
+            help='Comma-separated numbers of tokens per request.')
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size)
+                       for size in options['batch_sizes'].split(',')]
+        prefix = f'bench-introspection-{uuid.uuid4().hex[:8]}-'
+        try:
+            admin, token_list = self._create_fixtures(
+                prefix, max(batch_sizes))
+            self._run(admin, token_list, batch_sizes, options)
+        finally:
+            User.objects.filter(email__startswith=prefix).delete()
+            Group.objects.filter(name__startswith=prefix).delete()
+
+    @staticmethod
+    def _create_fixtures(prefix, count):
+        password = make_password(None)
+        users = [User(id=uuid.uuid4(), password=password, is_active=True,
+                      email=f'{prefix}{index}@example.com',
+                      username=f'{prefix}{index}')
+                 for index in range(count + 1)]
+        User.objects.bulk_create(users)
+        admin = users.pop()
+        admin.is_staff = True
+
+        group = Group.objects.create(name=f'{prefix}role')
+        group.permissions.set(Permission.objects.all()[:10])
+        group.user_set.set(users)
+
+        # Half opaque, half signed tokens.
+        opaque = Token.objects.bulk_create(
+            [Token(user=user, key=secrets.token_hex(20))
+             for user in users[::2]])
+        signed = [tokens.issue_access_token(user) for user in users[1::2]]
+        return admin, [token.key for token in opaque] + signed
+
+    def _run(self, admin, token_list, batch_sizes, options):
+        factory = APIRequestFactory()
+        view = IntrospectionView.as_view()
+
+        def introspect(batch):
+            request = factory.post('/api/token/introspect', {'tokens': batch},
+                                   format='json')
+            force_authenticate(request, user=admin)
+            response = view(request)
+            assert response.status_code == 200, response.data
+
+        self.stdout.write(f'{"tokens":>6}{"cold queries":>14}'
+                          f'{"warm queries":>14}{"requests/s":>12}'
+                          f'{"tokens/s":>11}')
+        for batch_size in batch_sizes:
+            batch = token_list[:batch_size]
+            with CaptureQueriesContext(connection) as cold:
+                introspect(batch)
+            with CaptureQueriesContext(connection) as warm:
+                introspect(batch)
+            requests_per_second = benchmarks.run_concurrently(
+                lambda: introspect(batch), options['threads'],
+                options['duration'])
+            self.stdout.write(
+                f'{batch_size:>6}{len(cold):>14}{len(warm):>14}'
+                f'{requests_per_second:>12.1f}'
+                f'{requests_per_second * batch_size:>11.1f}')
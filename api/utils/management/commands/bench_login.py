@@ -0,0 +1,121 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from auth import backends
+from users.models import User
+
+
+class _LegacyEmailOrUsernameModelBackend(ModelBackend):
+    # The pre-engine backend, kept here as the baseline.
+    def authenticate(self, request, **kwargs):
+        username = kwargs['username']
+        password = kwargs['password']
+
+        if username and backends.EMAIL_PATTERN.search(username):
+            kwargs = {'email': username}
+        else:
+            kwargs = {'username': username}
+
+        try:
+            user = User.objects.get(**kwargs)
+        except User.DoesNotExist:
+            return None
+        else:
+            if user.is_active and user.check_password(password):
+                return user
+
+        return None
+
+
+def _legacy_get_user_by_username(username):
+    # The serializer's pre-engine lookup: `iexact`, which the lower()
+    # indexes of the current engine do not serve.
+    if username and backends.EMAIL_PATTERN.search(username):
+        username_field = 'email'
+    else:
+        username_field = 'username'
+
+    return User.objects.filter(**{
+        username_field + '__iexact': username
+    }).first()
+
+
+def legacy_login(username, password):
+    user_account = _legacy_get_user_by_username(username)
+    if not user_account:
+        return None
+
+    for backend in (ModelBackend(), _LegacyEmailOrUsernameModelBackend()):
+        user = backend.authenticate(None, username=username, password=password)
+        if user is not None:
+            return user
+
+    return None
+
+
+def engine_login(username, password):
+    return authenticate(username=username, password=password)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Measures queries per login and p50/p99 login latency for the '
+            'legacy login path and the current login engine.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with transaction.atomic():
+            suffix = uuid.uuid4().hex[:8]
+            email = f'bench-{suffix}@example.com'
+            username = f'bench-{suffix}'
+            User.objects.create_user(email, 'bench-password-1234',
+                                     username=username)
+
+            scenarios = [
+                ('email, valid password', email, 'bench-password-1234'),
+                ('username, valid password', username, 'bench-password-1234'),
+                ('username, wrong password', username, 'wrong-password'),
+                ('unknown account', f'nobody-{suffix}', 'wrong-password'),
+            ]
+            engines = [('legacy', legacy_login), ('engine', engine_login)]
+
+            self.stdout.write(
+                f'{"scenario":<28}{"path":<8}{"queries":>8}'
+                f'{"p50 ms":>10}{"p99 ms":>10}')
+            for label, login, password in scenarios:
+                for name, engine in engines:
+                    queries, p50, p99 = self._measure(
+                        engine, login, password, iterations)
+                    self.stdout.write(
+                        f'{label:<28}{name:<8}{queries:>8.1f}'
+                        f'{p50:>10.2f}{p99:>10.2f}')
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _measure(engine, login, password, iterations):
+        samples = []
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                engine(login, password)
+                samples.append((time.perf_counter() - started) * 1000)
+
+        return (len(captured) / float(iterations),
+                statistics.median(samples), percentile(samples, 99))
@@ -0,0 +1,109 @@
+import itertools
+import uuid
+
+from django.contrib.auth.password_validation import validate_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from auth import hashing, serializers
+from users.models import User
+from utils import benchmarks
+
+PASSWORD = 'bench-password-1234'
+
+
+class _LegacySignUpSerializer(serializers.SignUpSerializer):
+    # The pre-streamlining signup, kept here as the baseline.
+    class Meta(serializers.SignUpSerializer.Meta):
+        extra_kwargs = {}
+
+    def validate_email(self, value):
+        return value
+
+    def validate(self, attrs):
+        validate_password(attrs.get('password'), User(**attrs))
+        return attrs
+
+    @staticmethod
+    def perform_create(validated_data):
+        validated_data = dict(validated_data)
+        encoded_password = hashing.make_password(
+            validated_data.pop('password'))
+        with transaction.atomic():
+            # The manager's old _create_user: a plain save(), which tries
+            # an UPDATE of the new primary key before the INSERT.
+            user = User(
+                email=User.objects.normalize_email(
+                    validated_data.pop('email')),
+                is_staff=False, is_superuser=False, **validated_data)
+            user.password = encoded_password
+            user.save()
+            user.is_active = True
+            user.save(update_fields=['is_active'])
+        return user
+
+
+def signup_with(serializer_class):
+    def signup(data):
+        serializer = serializer_class(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+    return signup
+
+
+class Command(BaseCommand):
+    help = ('Measures queries per signup and signups/sec of one worker '
+            'process under concurrent load for the legacy and the current '
+            'signup path.')
+
+    def add_arguments(self, parser):
+        benchmarks.add_concurrency_arguments(parser)
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help='Hash with MD5 to measure the database path alone.')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-signup-{uuid.uuid4().hex[:8]}-'
+        overrides = {}
+        if options['fast_hasher']:
+            overrides = {
+                'PASSWORD_HASHERS': [
+                    'django.contrib.auth.hashers.MD5PasswordHasher'],
+                'PASSWORD_HASHING_POOL': 'none',
+            }
+
+        # Signup threads commit through their own connections, so the
+        # accounts are deleted at the end.
+        try:
+            with override_settings(**overrides):
+                self._run(prefix, options)
+        finally:
+            User.objects.filter(email__startswith=prefix).delete()
+
+    def _run(self, prefix, options):
+        counter = itertools.count()
+
+        def next_data():
+            index = next(counter)
+            return {'username': f'{prefix}{index}',
+                    'email': f'{prefix}{index}@example.com',
+                    'password': PASSWORD}
+
+        self.stdout.write(f'{"path":<9}{"queries":>8}{"signups/s":>11}')
+        for name, serializer_class in (
+                ('legacy', _LegacySignUpSerializer),
+                ('current', serializers.SignUpSerializer)):
+            signup = signup_with(serializer_class)
+            with CaptureQueriesContext(connection) as captured:
+                signup(next_data())
+
+            def request():
+                # Each signup is a request in ATOMIC_REQUESTS mode.
+                with transaction.atomic():
+                    signup(next_data())
+
+            signups_per_second = benchmarks.run_concurrently(
+                request, options['threads'], options['duration'])
+            self.stdout.write(f'{name:<9}{len(captured):>8}'
+                              f'{signups_per_second:>11.1f}')
@@ -0,0 +1,56 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users import importing
+
+
+class Command(BaseCommand):
+    help = ('Imports users from a CSV or JSON Lines file (- for stdin) with '
+            'columns email, username, password or password_hash, and roles. '
+            'Invalid rows are reported and skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importing.FORMATS,
+                            help='Defaults to the file extension, else csv.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--hash-workers', type=int, default=0,
+            help='Processes hashing plain passwords, 0 for one per CPU.')
+        parser.add_argument(
+            '--skip-password-validation', action='store_true',
+            help='Accept plain passwords that fail AUTH_PASSWORD_VALIDATORS.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or importing.guess_format(path)
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(e)
+
+        importer = importing.UserImporter(
+            batch_size=options['batch_size'],
+            hash_workers=options['hash_workers'],
+            validate_passwords=not options['skip_password_validation'])
+        started = time.perf_counter()
+        with stream, importer:
+            for errors in importer.run(importing.read_rows(stream, format)):
+                for line, email, message in errors:
+                    self.stderr.write(f'line {line}: {email} {message}')
+                self._progress(importer.report, started)
+
+        report = importer.report
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} of {report.rows} users '
+            f'({len(report.errors)} failed, {report.memberships} role '
+            f'memberships) in {time.perf_counter() - started:.1f}s.'))
+
+    def _progress(self, report, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{report.rows} rows, {report.created} created, '
+            f'{len(report.errors)} failed, '
+            f'{report.created / elapsed if elapsed else 0:.0f} users/s')
@@ -0,0 +1,40 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from utils import sessions
+
+
+class Command(BaseCommand):
+    help = ('Moves the unexpired database sessions to the session cache, '
+            'so their users stay logged in after switching to '
+            'SESSION_STORE=cache, and deletes the expired ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expired, _ = Session.objects.filter(
+            expire_date__lte=timezone.now()).delete()
+
+        moved = 0
+        batch_size = options['batch_size']
+        while True:
+            # Moved sessions leave the table, so each batch starts over.
+            batch = list(Session.objects.filter(
+                expire_date__gt=timezone.now())[:batch_size])
+            for session in batch:
+                sessions.move_to_cache(session)
+            remaining = Session.objects.filter(
+                pk__in=[session.pk for session in batch]).count()
+            moved += len(batch) - remaining
+            if remaining:
+                self.stderr.write(f'{remaining} sessions could not be '
+                                  f'cached, is the cache available?')
+                break
+            if len(batch) < batch_size:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} sessions to the cache, deleted {expired} '
+            f'expired ones.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import RefreshToken
+
+
+class Command(BaseCommand):
+    help = ('Deletes the expired refresh tokens of AUTH_TOKEN_MODE=signed. '
+            'Run it periodically, e.g. daily from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Short transactions: a batch at a time through the index on
+            # expires_at.
+            batch = list(RefreshToken.objects.filter(expires_at__lt=now)
+                         .values_list('pk', flat=True)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            deleted += RefreshToken.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired refresh tokens.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from utils import transactions
+
+
+class Command(BaseCommand):
+    help = ('Lists the URL patterns and which of their HTTP methods run '
+            'inside a transaction (ATOMIC_REQUESTS or an atomic_methods '
+            'policy) and which run in autocommit.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--atomic-only', action='store_true',
+                            help='Only list endpoints with atomic methods.')
+
+    def handle(self, *args, **options):
+        rows = transactions.get_transaction_report()
+        if options['atomic_only']:
+            rows = [row for row in rows if row[2]]
+
+        self.stdout.write(transactions.format_transaction_report(rows))
@@ -0,0 +1,36 @@
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, value=1):
+    """
+    Increments the process-local counter `name` by `value`.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def get(name):
+    return _counters.get(name, 0)
+
+
+def snapshot(prefix=None):
+    """
+    Returns a copy of the counters, optionally restricted to the
+    names starting with `prefix`.
+    """
+    with _lock:
+        items = dict(_counters)
+
+    if prefix:
+        return {k: v for k, v in items.items() if k.startswith(prefix)}
+
+    return items
+
+
+def reset():
+    with _lock:
+        _counters.clear()
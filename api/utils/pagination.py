@@ -0,0 +1,118 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def after(queryset, ordering, position):
+    """
+    Filters `queryset` to the rows past `position` in the keyset order
+    `ordering` = (field, unique tiebreaker field), both ascending.
+    """
+    field, tiebreaker = ordering
+    value, tiebreaker_value = position
+    # The redundant range condition lets the planner seek the composite
+    # index instead of evaluating the OR over every row.
+    return queryset.filter(**{f'{field}__gte': value}).filter(
+        Q(**{f'{field}__gt': value})
+        | Q(**{field: value, f'{tiebreaker}__gt': tiebreaker_value}))
+
+
+def get_position(obj, ordering):
+    return tuple(getattr(obj, name) for name in ordering)
+
+
+def iterate_chunks(queryset, ordering, chunk_size):
+    """
+    Yields `queryset` in keyset order as lists of at most `chunk_size`
+    objects. Each chunk is a fresh query, so prefetch_related applies and
+    memory stays constant however large the table is.
+    """
+    queryset = queryset.order_by(*ordering)
+    position = None
+    while True:
+        page = queryset if position is None else after(
+            queryset, ordering, position)
+        chunk = list(page[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = get_position(chunk[-1], ordering)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over `ordering`, a field and a unique tiebreaker
+    backed by a composite index. Every page is an index seek, unlike
+    OFFSET which scans all the rows it skips.
+    """
+    ordering = ()
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+    invalid_cursor_message = _('Invalid cursor.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = after(queryset, self.ordering, position)
+        # One extra row tells whether there is a next page.
+        page = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_position = get_position(page[-1], self.ordering)
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            fields = [model._meta.get_field(name) for name in self.ordering]
+            # Ordering values are never null, and None cannot be compared to.
+            if (not isinstance(values, list) or len(values) != len(fields)
+                    or any(value is None for value in values)):
+                raise ValueError
+            return tuple(field.to_python(value)
+                         for field, value in zip(fields, values))
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat')
+                  else str(value) for value in position]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,19 @@
+"""
+Helpers for worker processes that do not inherit the parent's memory.
+
+Keep this module free of imports that need the app registry: it is
+imported by the child before Django is set up.
+"""
+import django
+from django.conf import settings
+
+
+def setup_django(overrides=()):
+    """
+    `ProcessPoolExecutor` initializer: sets Django up in a spawned or
+    forkserver child and applies the `(name, value)` setting `overrides`
+    the parent runs with (e.g. from override_settings).
+    """
+    django.setup()
+    for name, value in overrides:
+        setattr(settings, name, value)
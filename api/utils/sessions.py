@@ -0,0 +1,51 @@
+"""
+Session engine keeping sessions in the shared cache only, selected with
+SESSION_STORE=cache. Sessions expire with their cache entries, so there
+is no table to query on every page view or to purge.
+
+Sessions created in the database before the switch keep working: on a
+cache miss the session is looked up in the table once, copied to the
+cache for the rest of its lifetime and deleted from the table. Turn
+SESSION_DB_FALLBACK off once SESSION_COOKIE_AGE has passed since the
+switch, or move every session at once with `manage.py migrate_sessions`.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends import cache
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from . import metrics
+
+
+def move_to_cache(session):
+    """
+    Copies the database `session` to the session cache until it expires
+    and deletes it from the table, unless the cache is unavailable.
+    Returns the session data.
+    """
+    store = SessionStore(session.session_key)
+    data = store.decode(session.session_data)
+    remaining = (session.expire_date - timezone.now()).total_seconds()
+    store._cache.add(store.cache_key, data, max(int(remaining), 1))
+
+    # A cache that failed silently would lose the session with the row.
+    if store._cache.get(store.cache_key) is not None:
+        session.delete()
+        metrics.incr('sessions.migrated')
+    return data
+
+
+class SessionStore(cache.SessionStore):
+    def load(self):
+        session_key = self._session_key
+        data = super().load()
+        if (self._session_key is None and session_key
+                and settings.SESSION_DB_FALLBACK):
+            session = Session.objects.filter(
+                session_key=session_key,
+                expire_date__gt=timezone.now()).first()
+            if session is not None:
+                self._session_key = session_key
+                data = move_to_cache(session)
+
+        return data
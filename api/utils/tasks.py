@@ -0,0 +1,35 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from kombu.exceptions import OperationalError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _send(task, args, kwargs):
+    try:
+        task.apply_async(args, kwargs, retry=False)
+        metrics.incr('tasks.queued')
+    except (OperationalError, OSError):
+        # Losing the side effect is worse than paying for it in-process.
+        logger.warning('Broker unavailable, running %s in-process.', task.name)
+        metrics.incr('tasks.fallback')
+        task.apply(args, kwargs)
+
+
+def dispatch(task, *args, **kwargs):
+    """
+    Queues a Celery task once the current transaction commits, so the
+    worker sees what the request wrote and nothing is sent for a request
+    that rolls back. With CELERY_TASK_ALWAYS_EAGER the task runs right
+    away, in-process and inside the transaction.
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        metrics.incr('tasks.eager')
+        task.apply(args, kwargs)
+        return
+
+    transaction.on_commit(lambda: _send(task, args, kwargs))
@@ -0,0 +1,263 @@
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django_redis import get_redis_connection
+from kombu.exceptions import OperationalError
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from utils import metrics, tasks, throttling
+from utils.db import pool, routers
+from utils.db.middleware import PIN_COOKIE_NAME, ReplicaPinningMiddleware
+from utils.db.backends.postgresql_pool.base import DatabaseWrapper
+
+
+class FakeConnection(object):
+    autocommit = True
+
+    def __init__(self, healthy=True):
+        self.closed = 0
+        self.healthy = healthy
+
+    def cursor(self):
+        if not self.healthy:
+            raise Exception('server closed the connection unexpectedly')
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def make_pool(self, **kwargs):
+        return pool.ConnectionPool(self.connect, metrics_prefix='test.pool', **kwargs)
+
+    def test_checkin_reuses_connection(self):
+        connection_pool = self.make_pool(size=2)
+        conn = connection_pool.checkout()
+        connection_pool.checkin(conn)
+
+        self.assertIs(connection_pool.checkout(), conn)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(metrics.get('test.pool.checked_out'), 1)
+        self.assertEqual(connection_pool.stats()['checked_out'], 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        connection_pool = self.make_pool(size=1, timeout=0.01)
+        connection_pool.checkout()
+
+        with self.assertRaises(pool.PoolTimeout):
+            connection_pool.checkout()
+        self.assertEqual(metrics.get('test.pool.waits'), 1)
+        self.assertEqual(metrics.get('test.pool.timeouts'), 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        connection_pool = self.make_pool(size=1, health_check_interval=0)
+        conn = connection_pool.checkout()
+        connection_pool.checkin(conn)
+        conn.healthy = False
+
+        replacement = connection_pool.checkout()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(metrics.get('test.pool.health_check_failures'), 1)
+        self.assertEqual(connection_pool.stats()['open'], 1)
+
+    def test_closed_connection_frees_its_slot(self):
+        connection_pool = self.make_pool(size=1, timeout=0.01)
+        conn = connection_pool.checkout()
+        conn.close()
+        connection_pool.checkin(conn)
+
+        self.assertIsNot(connection_pool.checkout(), conn)
+
+
+class PooledDatabaseWrapperTest(TestCase):
+    def test_connection_is_returned_to_the_pool(self):
+        settings_dict = dict(connection.settings_dict, POOL={'SIZE': 1})
+        wrapper = DatabaseWrapper(settings_dict, alias=connection.alias)
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            raw_connection = wrapper.connection
+            wrapper.close()
+
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertIs(wrapper.connection, raw_connection)
+        finally:
+            wrapper.close()
+            pool.close_pools(lambda key: key[0] == connection.alias)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_MAX_LAG=5,
+                   DATABASE_REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        routers.reset()
+        self.router = routers.ReplicaRouter()
+        self.lag = 0
+        patcher = mock.patch.object(self.router, 'measure_lag', lambda alias: self.lag)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(connection, 'in_atomic_block', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(routers.reset)
+
+    def test_reads_go_to_a_replica(self):
+        self.assertEqual(self.router.db_for_read(Group), 'replica')
+        self.assertEqual(metrics.get('db.replica.reads'), 1)
+
+    def test_unrouted_apps_are_left_alone(self):
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.lag = 30
+        self.assertEqual(self.router.db_for_read(Group), 'default')
+        self.assertEqual(metrics.get('db.replica.fallbacks'), 1)
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        self.lag = None
+        self.assertEqual(self.router.db_for_read(Group), 'default')
+
+    def test_reads_after_a_write_use_primary(self):
+        self.assertEqual(self.router.db_for_write(Group), 'default')
+        self.assertTrue(routers.has_written())
+        self.assertEqual(self.router.db_for_read(Group), 'default')
+
+    def test_use_primary_and_transactions(self):
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(Group), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Group), 'default')
+        self.assertEqual(self.router.db_for_read(Group), 'replica')
+
+    def test_pinning_middleware(self):
+        def write(request):
+            self.router.db_for_write(Group)
+            return HttpResponse()
+
+        def read(request):
+            return HttpResponse(self.router.db_for_read(Group))
+
+        factory = RequestFactory()
+        response = ReplicaPinningMiddleware(write)(factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], 10)
+        self.assertFalse(routers.has_written())
+
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        self.assertEqual(ReplicaPinningMiddleware(read)(request).content, b'default')
+        self.assertEqual(ReplicaPinningMiddleware(read)(factory.get('/')).content, b'replica')
+
+
+class DispatchTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_broker_failure_runs_task_in_process(self):
+        task = mock.Mock()
+        task.apply_async.side_effect = OperationalError('Connection refused')
+        tasks._send(task, ('a',), {'b': 1})
+
+        task.apply.assert_called_once_with(('a',), {'b': 1})
+        self.assertEqual(metrics.get('tasks.fallback'), 1)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_tasks_are_queued_on_commit(self):
+        task = mock.Mock()
+        with mock.patch('utils.tasks.transaction.on_commit') as on_commit:
+            tasks.dispatch(task, 'a')
+        task.apply_async.assert_not_called()
+
+        on_commit.call_args[0][0]()
+        task.apply_async.assert_called_once_with(('a',), {}, retry=False)
+
+
+class ThrottlingTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_local_limiter(self):
+        limiter = throttling.LocalLimiter(maxsize=10)
+        with mock.patch('utils.throttling.time.monotonic', return_value=100.0) as monotonic:
+            self.assertEqual([limiter.hit('key', 1.0, 3) for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(limiter.hit('key', 1.0, 3), 1.0)
+            self.assertEqual(limiter.hit('other', 1.0, 3), 0)
+
+            monotonic.return_value = 101.0
+            self.assertEqual(limiter.hit('key', 1.0, 3), 0)
+            self.assertAlmostEqual(limiter.hit('key', 1.0, 3), 1.0)
+
+    def test_redis_script(self):
+        limiter = throttling.GCRALimiter()
+        try:
+            get_redis_connection().ping()
+        except RedisError:
+            self.skipTest('Redis is not available.')
+
+        key = f'test-{uuid.uuid4().hex}'
+        self.assertEqual([limiter.hit(key, 3, 60) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.hit(key, 3, 60), 20, delta=0.1)
+        self.assertEqual(metrics.get('throttle.fallback'), 0)
+
+    def test_redis_failure_falls_back_to_local_limiter(self):
+        limiter = throttling.GCRALimiter()
+        script = mock.Mock(side_effect=RedisError('Connection refused'))
+        with mock.patch.object(limiter, '_get_script', return_value=script):
+            self.assertEqual(limiter.hit('key', 1, 60), 0)
+            self.assertAlmostEqual(limiter.hit('key', 1, 60), 60, delta=0.1)
+
+        # Redis is not tried again until the retry interval has passed.
+        self.assertEqual(script.call_count, 1)
+        self.assertEqual(metrics.get('throttle.fallback'), 2)
+
+    def test_scoped_throttle(self):
+        class ScopedView(APIView):
+            permission_classes = ()
+            throttle_classes = (throttling.ScopedRateThrottle, )
+            throttle_scope = f'test-{uuid.uuid4().hex}'
+
+            def post(self, request):
+                return Response()
+
+            def get(self, request):
+                return Response()
+
+        rates = {ScopedView.throttle_scope: '2/minute', 'read': None}
+        view = ScopedView.as_view()
+        factory = APIRequestFactory()
+        with mock.patch.object(throttling.ScopedRateThrottle, 'THROTTLE_RATES', rates):
+            statuses = [view(factory.post('/')).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            self.assertEqual(view(factory.post('/'))['Retry-After'], '30')
+
+            ScopedView.throttle_scope = None
+            self.assertEqual(view(factory.get('/')).status_code, 200)
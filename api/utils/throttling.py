@@ -0,0 +1,158 @@
+"""
+Rate limiting with the generic cell rate algorithm (GCRA).
+
+A `rate` of N requests per period allows bursts of N and then one request
+every period / N. Each key stores a single timestamp, the theoretical
+arrival time of the next request, updated by one Lua script in Redis: one
+round-trip per check, atomic across workers, with the Redis clock so the
+workers' clocks do not matter.
+
+When Redis cannot be reached the check runs against an in-process
+limiter instead (`throttle.fallback` at `/api/metrics`), so limits keep
+applying, per worker process, rather than being lifted. Redis is tried
+again after THROTTLE_REDIS_RETRY_INTERVAL seconds.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework import permissions, throttling
+
+from . import metrics
+from .cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: the key; ARGV: emission interval and period in microseconds.
+# Returns 0 when the request is allowed, else the microseconds to wait.
+GCRA_SCRIPT = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local emission = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local new_tat = tat + emission
+if new_tat - now > period then
+    return math.ceil(new_tat - now - period)
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil((new_tat - now) / 1000))
+return 0
+"""
+
+
+class LocalLimiter(object):
+    """
+    The GCRA over a process-local LRU of theoretical arrival times.
+    """
+
+    def __init__(self, maxsize):
+        self._tats = LocalLRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def hit(self, key, emission, period):
+        with self._lock:
+            now = time.monotonic()
+            new_tat = max(self._tats.get(key, now), now) + emission
+            if new_tat - now > period:
+                return new_tat - now - period
+
+            self._tats.set(key, new_tat, timeout=new_tat - now)
+            return 0
+
+
+class GCRALimiter(object):
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self.local = LocalLimiter(settings.THROTTLE_LOCAL_MAXSIZE)
+        self._script = None
+        self._retry_at = 0
+
+    def _get_script(self):
+        if self._script is None:
+            client = get_redis_connection(self.cache_alias)
+            self._script = client.register_script(GCRA_SCRIPT)
+        return self._script
+
+    def hit(self, key, num_requests, duration):
+        """
+        Counts a request against `key`, limited to `num_requests` per
+        `duration` seconds. Returns 0 when it is allowed, else the seconds
+        until the next request will be.
+        """
+        emission = duration / num_requests
+        if time.monotonic() >= self._retry_at:
+            try:
+                wait = self._get_script()(
+                    keys=[caches[self.cache_alias].make_key(key)],
+                    args=[int(emission * 10 ** 6), duration * 10 ** 6])
+                return wait / 10 ** 6
+            except (RedisError, NotImplementedError) as e:
+                # NotImplementedError: the cache is not django_redis.
+                logger.warning('Throttling in-process, Redis unavailable: '
+                               '%s', e)
+                self._retry_at = (time.monotonic()
+                                  + settings.THROTTLE_REDIS_RETRY_INTERVAL)
+
+        metrics.incr('throttle.fallback')
+        return self.local.hit(key, emission, duration)
+
+
+limiter = GCRALimiter()
+
+
+class GCRAThrottleMixin(object):
+    """
+    Replaces the request history of DRF's SimpleRateThrottle, a growing
+    timestamp list read and rewritten in the cache on every request, with
+    one `limiter` check. Rates and cache keys work as in DRF.
+    """
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.delay = limiter.hit(self.key, self.num_requests, self.duration)
+        if self.delay:
+            metrics.incr('throttle.rejected')
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(GCRAThrottleMixin, throttling.ScopedRateThrottle):
+    """
+    Limits each client per `throttle_scope` of the view. Safe requests to
+    views without a scope count against the `read` scope.
+    """
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if self.scope is None and request.method in permissions.SAFE_METHODS:
+            self.scope = 'read'
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
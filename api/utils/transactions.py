@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import transaction
+from django.urls import URLPattern, URLResolver, get_resolver
+
+WRITE_METHODS = ('post', 'put', 'patch', 'delete')
+
+
+def _atomic_request_aliases():
+    return [alias for alias, db in settings.DATABASES.items()
+            if db.get('ATOMIC_REQUESTS')]
+
+
+class TransactionPolicyMixin(object):
+    """
+    Opts a class-based view out of ATOMIC_REQUESTS and only wraps the
+    HTTP methods listed in `atomic_methods` in a transaction; the others
+    run in autocommit. Works with Django and DRF views alike.
+
+    Exceptions handled by DRF still roll the transaction back, since
+    `set_rollback` applies to the innermost atomic block.
+    """
+    atomic_methods = WRITE_METHODS
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        for alias in _atomic_request_aliases():
+            view = transaction.non_atomic_requests(using=alias)(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() in self.atomic_methods:
+            with transaction.atomic():
+                return super().dispatch(request, *args, **kwargs)
+
+        return super().dispatch(request, *args, **kwargs)
+
+
+def _iter_patterns(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _iter_patterns(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern
+
+
+def _view_methods(view_class):
+    return [method for method in view_class.http_method_names
+            if method not in ('options', 'head')
+            and hasattr(view_class, method)]
+
+
+def get_transaction_report(urlconf=None):
+    """
+    Returns one `(route, name, atomic methods, autocommit methods)` row per
+    URL pattern, telling which HTTP methods run inside a transaction.
+    Methods of function-based views are reported as '*'.
+    """
+    aliases = set(_atomic_request_aliases())
+    rows = []
+    for route, pattern in _iter_patterns(get_resolver(urlconf).url_patterns):
+        callback = pattern.callback
+        view_class = (getattr(callback, 'view_class', None)
+                      or getattr(callback, 'cls', None))
+        methods = _view_methods(view_class) if view_class else ['*']
+        opted_out = aliases.issubset(
+            getattr(callback, '_non_atomic_requests', set()))
+
+        if not aliases:
+            atomic = []
+        elif not opted_out:
+            atomic = methods
+        else:
+            policy = getattr(view_class, 'atomic_methods', ())
+            atomic = [method for method in methods if method in policy]
+
+        autocommit = [method for method in methods if method not in atomic]
+        rows.append((route, pattern.name, atomic, autocommit))
+
+    return rows
+
+
+def format_transaction_report(rows):
+    lines = []
+    for route, name, atomic, autocommit in rows:
+        atomic = ','.join(atomic).upper() or '-'
+        autocommit = ','.join(autocommit).upper() or '-'
+        lines.append(f'/{route:<45} atomic={atomic:<24} autocommit={autocommit}')
+
+    return '\n'.join(lines)
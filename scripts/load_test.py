@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Measures how throughput scales with the number of gunicorn workers.
+
+For every worker count given, a gunicorn server is started from
+api/config/gunicorn.py, warmed up through /healthz and then hit by
+`--concurrency` client threads for `--duration` seconds.
+
+    python scripts/load_test.py --workers 1,2,4,8 --path /api/roles \\
+        --header "Authorization: Token <token>"
+
+The environment of this script (DATABASE_URL, DJANGO_SECRET_KEY, ...) is
+passed on to the server. Uses the standard library only.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONFIG = os.path.join(ROOT_DIR, 'api', 'config', 'gunicorn.py')
+
+
+def wait_until_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/healthz', headers={'Host': 'localhost'})
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+
+    raise RuntimeError('Server did not become ready in time.')
+
+
+def run_client(host, port, path, headers, stop_at, latencies, errors, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    samples = []
+    failures = 0
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                failures += 1
+        except (OSError, http.client.HTTPException):
+            failures += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        samples.append(time.perf_counter() - started)
+
+    with lock:
+        latencies.extend(samples)
+        errors.append(failures)
+
+
+def run_load(host, port, path, headers, concurrency, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    clients = [
+        threading.Thread(target=run_client, args=(
+            host, port, path, headers, stop_at, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rps': len(latencies) / float(duration),
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+    }
+
+
+def parse_headers(values):
+    headers = {'Host': 'localhost'}
+    for value in values:
+        name, _, content = value.partition(':')
+        headers[name.strip()] = content.strip()
+    return headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', default='1,2,4',
+                        help='Comma-separated worker counts to compare.')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Threads per worker (GUNICORN_THREADS).')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=int, default=15)
+    parser.add_argument('--path', default='/healthz')
+    parser.add_argument('--header', action='append', default=[])
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    headers = parse_headers(args.header)
+    print(f'{"workers":>8}{"requests":>10}{"errors":>8}{"req/s":>10}'
+          f'{"p50 ms":>10}{"p99 ms":>10}')
+
+    for workers in [int(count) for count in args.workers.split(',')]:
+        env = dict(os.environ,
+                   WEB_CONCURRENCY=str(workers),
+                   GUNICORN_THREADS=str(args.threads),
+                   GUNICORN_BIND=f'{host}:{args.port}',
+                   GUNICORN_ACCESS_LOG='/dev/null')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', GUNICORN_CONFIG],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(host, args.port)
+            result = run_load(host, args.port, args.path, headers,
+                              args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(f'{workers:>8}{result["requests"]:>10}{result["errors"]:>8}'
+              f'{result["rps"]:>10.1f}{result["p50"]:>10.2f}'
+              f'{result["p99"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()